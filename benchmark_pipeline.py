@@ -0,0 +1,302 @@
+import io
+import os
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from typing import Dict, List
+from sheet_backend import MemorySheetBackend
+from benchmark_themis_log import generate_log
+
+HEADER = ["Timestamp", "Email", "Problem", "Language", "Source", "Status", "Judge"]
+PROBLEMS = {
+    "A": {"name": "BAI1", "time_limit": 1},
+    "B": {"name": "BAI2", "time_limit": 1, "judge_type": "Gemini", "statement": ""},
+}
+
+
+def install_gemini_stub(delay: float, seed: int):
+    # Stands in for gemini_api before anything imports it, so the real client
+    # is never configured
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def call_gemini_api(
+        prompt: str,
+        timeout: float | None = None,
+        context: str = "",
+        context_key: str | None = None,
+    ) -> str:
+        with lock:
+            duration = rng.uniform(delay / 2, delay * 3 / 2)
+        time.sleep(duration)
+
+        test_cases = [
+            {"points": 6, "verdict": "AC", "estimated_execution_time": 15}
+            for _ in range(10)
+        ]
+        return json.dumps(
+            {
+                "total_points": 100,
+                "verdict": "AC",
+                "explanation": "Benchmark",
+                "test_cases": test_cases,
+            }
+        )
+
+    module = types.ModuleType("gemini_api")
+    module.call_gemini_api = call_gemini_api
+    sys.modules["gemini_api"] = module
+
+
+def fake_themis(
+    delay: float,
+    test_count: int,
+    result_messages: dict,
+    seed: int,
+    stopped: threading.Event,
+):
+    # Judges one file at a time like Themis, leaving the log behind
+    rng = random.Random(seed)
+    os.makedirs("Submissions/Logs", exist_ok=True)
+
+    while not stopped.is_set():
+        names = sorted(
+            name
+            for name in os.listdir("Submissions")
+            if os.path.isfile(os.path.join("Submissions", name))
+        )
+
+        for name in names:
+            time.sleep(rng.uniform(delay / 2, delay * 3 / 2))
+
+            problem_name = name[name.rfind("[") + 1 : name.rfind("]")]
+            log = generate_log(
+                result_messages, problem_name, test_count, rng.randint(0, 10**9)
+            )
+
+            os.remove(os.path.join("Submissions", name))
+            with open(f"Submissions/Logs/{name}.log", "w", encoding="utf8") as f:
+                f.write(log)
+
+        time.sleep(0.01)
+
+
+def feed(backend: MemorySheetBackend, args, submitted_at: Dict[int, float]):
+    rng = random.Random(args.seed)
+
+    # One contestant sends a burst of submissions before everyone else
+    for i in range(args.burst + args.submissions):
+        problem = "B" if rng.random() < args.gemini_share else "A"
+        source = f"int main() {{\n    int x = {i};\n    return 0;\n}}"
+
+        contestant = f"contestant{(i - args.burst) % args.contestants}"
+        if i < args.burst:
+            contestant = "burst"
+
+        submitted_at[i + 2] = time.time()
+        backend.append_row(
+            [
+                time.strftime("%d/%m/%Y %H:%M:%S"),
+                f"{contestant}@example.com",
+                f"{problem}. {PROBLEMS[problem]['name']}",
+                "C++",
+                source,
+            ]
+        )
+
+        if args.rate > 0 and i >= args.burst:
+            time.sleep(rng.expovariate(args.rate))
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def setup_workspace(args, repo_dir: str) -> str:
+    workspace = tempfile.mkdtemp(prefix="tloj-benchmark-")
+
+    with open(os.path.join(repo_dir, "config.json"), "r", encoding="utf8") as f:
+        config = json.load(f)
+
+    config.update(
+        {
+            "delay_time": args.delay_time,
+            "claim_settle_time": args.settle_time,
+            "max_in_flight": args.max_in_flight,
+            "metrics_port": 0,
+        }
+    )
+    if args.scheduling_policy:
+        config["scheduling_policy"] = args.scheduling_policy
+
+    files = {
+        "config.json": config,
+        "data.json": {
+            "sheet_id": "benchmark",
+            "contest_id": "benchmark",
+            "problems_data": PROBLEMS,
+        },
+        "key.json": {"client_id": "benchmark"},
+    }
+
+    for name, content in files.items():
+        with open(os.path.join(workspace, name), "w", encoding="utf8") as f:
+            json.dump(content, f)
+
+    return workspace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the judge pipeline")
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--contestants", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=0, help="from one contestant")
+    parser.add_argument("--rate", type=float, default=0, help="per second, 0 = all")
+    parser.add_argument("--gemini-share", type=float, default=0.2)
+    parser.add_argument("--themis-delay", type=float, default=0.1)
+    parser.add_argument("--themis-tests", type=int, default=20)
+    parser.add_argument("--gemini-delay", type=float, default=2)
+    parser.add_argument("--sheet-latency", type=float, default=0.05)
+    parser.add_argument("--sheet-failure-rate", type=float, default=0)
+    parser.add_argument("--delay-time", type=float, default=2)
+    parser.add_argument("--settle-time", type=float, default=3)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--scheduling-policy", choices=["fifo", "fair"])
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    workspace = setup_workspace(args, repo_dir)
+    os.chdir(workspace)
+
+    install_gemini_stub(args.gemini_delay, args.seed)
+    from judge_manager import JudgeManager
+
+    backend = MemorySheetBackend(
+        [HEADER], args.sheet_latency, args.sheet_failure_rate, args.seed
+    )
+    submitted_at: Dict[int, float] = {}
+    judged_at: Dict[int, float] = {}
+    total = args.burst + args.submissions
+
+    # The journal and caches are SQLite connections that belong to the thread
+    # that opened them, so the judge is built where it runs
+    judges: List[JudgeManager] = []
+    ready = threading.Event()
+    stopped = threading.Event()
+
+    def run_judge():
+        try:
+            judges.append(JudgeManager(backend))
+        finally:
+            ready.set()
+
+        judges[0].run()
+
+    with open("config.json", "r", encoding="utf8") as f:
+        result_messages = json.load(f)["result_message"]
+
+    output = sys.stdout if args.verbose else io.StringIO()
+    with redirect_stdout(output):
+        threading.Thread(
+            target=fake_themis,
+            args=(
+                args.themis_delay,
+                args.themis_tests,
+                result_messages,
+                args.seed,
+                stopped,
+            ),
+            daemon=True,
+        ).start()
+
+        if args.rate > 0:
+            threading.Thread(
+                target=feed, args=(backend, args, submitted_at), daemon=True
+            ).start()
+        else:
+            feed(backend, args, submitted_at)
+
+        start = time.time()
+        threading.Thread(target=run_judge, daemon=True).start()
+        ready.wait()
+
+        # Read the sheet directly so watching it costs no API calls
+        while judges and len(judged_at) < total and time.time() < start + args.timeout:
+            with backend.lock:
+                statuses = [
+                    (row, cells[5] if len(cells) > 5 else "")
+                    for row, cells in enumerate(backend.rows, 1)
+                ]
+
+            now = time.time()
+            for row, status in statuses:
+                if status == "Đã chấm" and row not in judged_at:
+                    judged_at[row] = now
+
+            time.sleep(0.01)
+
+    if not judges:
+        print("Unable to start the judge")
+        return
+
+    judge = judges[0]
+    elapsed = max(judged_at.values(), default=start) - start
+    latencies = [judged_at[row] - submitted_at[row] for row in judged_at]
+    others = [
+        judged_at[row] - submitted_at[row] for row in judged_at if row > args.burst + 1
+    ]
+    calls = dict(backend.calls)
+    stages = judge.metrics.snapshot()["histograms"]
+    stopped.set()
+
+    print(f"Judged {len(judged_at)}/{total} submissions in {elapsed:.1f}s")
+    if len(judged_at) < total:
+        print(f"Timed out after {args.timeout:.0f}s")
+
+    if elapsed > 0:
+        print(f"Throughput: {len(judged_at) * 60 / elapsed:.1f} submissions/min")
+
+    groups = [("Latency", latencies)]
+    if args.burst > 0:
+        groups.append(("Latency outside the burst", others))
+
+    for label, values in groups:
+        print(
+            f"{label}: "
+            + ", ".join(
+                f"p{int(q * 100)} {percentile(values, q):.2f}s"
+                for q in [0.5, 0.95, 0.99]
+            )
+        )
+
+    print(f"{'API call':<20}{'total':>8}{'per submission':>16}")
+    for name, count in sorted(calls.items()) + [("total", sum(calls.values()))]:
+        per_submission = count / max(1, len(judged_at))
+        print(f"{name:<20}{count:>8}{per_submission:>16.2f}")
+
+    print(f"{'stage':<20}{'count':>8}{'mean':>10}")
+    for name, histogram in stages.items():
+        if name.startswith("stage_seconds"):
+            stage = name[name.find('"') + 1 : name.rfind('"')]
+            print(f"{stage:<20}{histogram['count']:>8}{histogram['mean']:>9.2f}s")
+
+    os.chdir(repo_dir)
+    shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import json
+import random
+import time
+from models import JudgeResult, TestResult, ProblemData
+from themis_judge import ThemisJudge, TEST_MARKER
+
+TEST_COUNTS = [10, 100, 1000, 10000]
+REPEATS = 5
+
+
+# The multi-pass parser this module replaced, kept as the correctness and speed baseline
+class LegacyThemisJudge:
+    def __init__(self, result_messages: dict, round_digits: int):
+        self.result_messages = result_messages
+        self.round_digits = round_digits
+
+    def parse_log(self, log: str, problem_data: ProblemData) -> JudgeResult:
+        logs = log.split("\n")
+
+        problem_name, language = logs[1].split(".")
+
+        assert problem_name == problem_data.name, "Problem name does not match"
+
+        total_points = 0
+        max_execution_time = 0
+        final_message = None
+        tests_result = []
+
+        if self.result_messages["CE"] in log:
+            final_message = self.result_messages["CE"]
+            message = self._parse_compilation_error(logs, problem_name, language)
+            tests_result.append(TestResult(points=0, execution_time=0, message=message))
+        else:
+            total_points = round(
+                float(logs[0].split(" ")[-1].replace(",", ".")), self.round_digits
+            )
+
+            tests_result, max_execution_time, final_message = self._parse_test_results(
+                logs, problem_data.time_limit
+            )
+
+        total_points = round(total_points, self.round_digits)
+
+        return JudgeResult(
+            total_points=total_points,
+            max_execution_time=max_execution_time,
+            final_message=final_message,
+            tests_result=tests_result,
+        )
+
+    def _parse_compilation_error(
+        self, logs: list, problem_name: str, language: str
+    ) -> str:
+        message = self.result_messages["CE"]
+        for i in range(3, len(logs) - 1):
+            if logs[i] == "Dịch lỗi!":
+                break
+
+            if logs[i].split(".")[0] == problem_name:
+                logs[i] = logs[i].replace(problem_name, "main", 1)
+            elif logs[i].split(" ")[0] == "Error:" and language == "pas":  # Pascal
+                continue
+
+            message += "\n" + logs[i]
+
+        return message[:10000] + "..." if len(message) > 10000 else message
+
+    def _parse_test_results(self, logs: list, time_limit: float) -> tuple:
+        tests_result = []
+        max_execution_time = 0
+        final_message = None
+
+        i = 1
+        while i < len(logs) and chr(0x2023) not in logs[i]:
+            i += 1
+
+        while i < len(logs):
+            j = i + 1
+            while j < len(logs) and chr(0x2023) not in logs[j]:
+                j += 1
+            j -= 1
+
+            points = round(
+                float(logs[i].split(" ")[-1].replace(",", ".")), self.round_digits
+            )
+            execution_time = 0
+            message = self.result_messages["AC"]
+            exit_code = 0
+
+            for k in range(i, j + 1):
+                words = logs[k].split(" ")
+
+                for message_code in ["WA", "RE", "TLE", "NOF"]:
+                    if (
+                        self.result_messages[message_code] in logs[k]
+                        and message == self.result_messages["AC"]
+                    ):
+                        message = self.result_messages[message_code]
+
+                if words[:2] == ["Thời", "gian"]:
+                    execution_time = round(float(words[-2].replace(",", ".")) * 1000)
+
+                for idx in range(len(words) - 3):
+                    if words[idx : idx + 2] == ["exit", "code:"]:
+                        exit_code = int(words[idx + 2])
+
+            if message == self.result_messages["TLE"]:
+                execution_time = round(time_limit * 1000)
+
+            max_execution_time = max(max_execution_time, execution_time)
+
+            if message != self.result_messages["AC"] and final_message is None:
+                final_message = message
+
+            if message == self.result_messages["RE"]:
+                message += f" (exit code: {exit_code})"
+
+            tests_result.append(
+                TestResult(
+                    points=points, execution_time=execution_time, message=message
+                )
+            )
+
+            i = j + 1
+
+        if final_message is None:
+            final_message = self.result_messages["AC"]
+
+        return tests_result, max_execution_time, final_message
+
+
+def generate_log(
+    result_messages: dict, problem_name: str, test_count: int, seed: int
+) -> str:
+    rng = random.Random(seed)
+    contestant = f"0001[contestant][{problem_name}]"
+
+    lines = []
+    total_points = 0.0
+    for test in range(1, test_count + 1):
+        verdict = rng.choices(["AC", "WA", "TLE", "RE", "NOF"], [70, 15, 5, 5, 5])[0]
+        points = round(100 / test_count, 2) if verdict == "AC" else 0.0
+        total_points += points
+
+        lines.append(
+            f"{contestant}{TEST_MARKER}{problem_name}{TEST_MARKER}Test{test:03}: "
+            + f"{points:.2f}".replace(".", ",")
+        )
+        lines.append(f"Thời gian ≈ {rng.uniform(0, 1):.3f} giây".replace(".", ","))
+
+        if verdict == "RE":
+            code = rng.choice([1, 3, -1073741819])
+            lines.append(f"{result_messages['RE']}, exit code: {code} (runtime error)")
+        elif verdict != "AC":
+            lines.append(f"{result_messages[verdict]}!")
+        else:
+            lines.append(f"{result_messages['AC']}!")
+
+        for _ in range(rng.randint(0, 3)):
+            lines.append(f"Output line {rng.randint(0, 10**9)}")
+
+    header = (
+        f"{contestant}{TEST_MARKER}{problem_name}: "
+        + f"{total_points:.2f}".replace(".", ",")
+    )
+    return "\n".join([header, f"{problem_name}.cpp", "Dịch thành công."] + lines) + "\n"
+
+
+def generate_compilation_error_log(
+    result_messages: dict, problem_name: str, error_count: int, seed: int
+) -> str:
+    rng = random.Random(seed)
+
+    lines = [
+        f"0001[contestant][{problem_name}]{TEST_MARKER}{problem_name}: 0,00",
+        f"{problem_name}.cpp",
+        result_messages["CE"],
+    ]
+    for error in range(error_count):
+        lines.append(
+            f"{problem_name}.cpp:{error + 1}:{rng.randint(1, 80)}: error: "
+            + "expected ';' before 'return'"
+        )
+    lines.append("Dịch lỗi!")
+
+    return "\n".join(lines) + "\n"
+
+
+def measure(parse, log: str, problem_data: ProblemData) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        parse(log, problem_data)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main():
+    with open("config.json", "r", encoding="utf8") as f:
+        config = json.load(f)
+
+    result_messages = config["result_message"]
+    round_digits = config["round_digits"]
+
+    judge = ThemisJudge(result_messages, round_digits)
+    legacy_judge = LegacyThemisJudge(result_messages, round_digits)
+    problem_data = ProblemData.from_dict({"name": "BAI1", "time_limit": 1})
+
+    print(
+        f"{'log':<12}{'tests':>8}{'size':>12}{'legacy':>12}{'single':>12}{'speedup':>10}"
+    )
+
+    for test_count in TEST_COUNTS:
+        for kind, log in [
+            ("tests", generate_log(result_messages, "BAI1", test_count, test_count)),
+            (
+                "compile",
+                generate_compilation_error_log(
+                    result_messages, "BAI1", test_count, test_count
+                ),
+            ),
+        ]:
+            expected = legacy_judge.parse_log(log, problem_data)
+            actual = judge.parse_log(log, problem_data)
+            assert actual == expected, f"Results differ for {kind} log of {test_count}"
+
+            legacy_time = measure(legacy_judge.parse_log, log, problem_data)
+            single_time = measure(judge.parse_log, log, problem_data)
+
+            print(
+                f"{kind:<12}{test_count:>8}{len(log):>12}"
+                f"{legacy_time * 1000:>10.2f}ms{single_time * 1000:>10.2f}ms"
+                f"{legacy_time / single_time:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
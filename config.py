@@ -44,6 +44,178 @@ class Config:
     def reset_time(self) -> float:
         return self.config["reset_time"]
 
+    @property
+    def write_batch_size(self) -> int:
+        return self.config["write_batch_size"]
+
+    @property
+    def write_max_age(self) -> float:
+        return self.config["write_max_age"]
+
+    @property
+    def max_in_flight(self) -> int:
+        return self.config["max_in_flight"]
+
+    @property
+    def judge_max_rounds(self) -> int:
+        return self.config["judge_max_rounds"]
+
+    @property
+    def judge_retry_delay(self) -> float:
+        return self.config["judge_retry_delay"]
+
+    @property
+    def scheduling_policy(self) -> str:
+        return self.config["scheduling_policy"]
+
+    @property
+    def scheduling_aging_time(self) -> float:
+        return self.config["scheduling_aging_time"]
+
+    @property
+    def scheduling_weights(self) -> Dict[str, float]:
+        return self.config["scheduling_weights"]
+
+    @property
+    def watch_interval(self) -> float:
+        return self.config["watch_interval"]
+
+    @property
+    def log_settle_time(self) -> float:
+        return self.config["log_settle_time"]
+
+    @property
+    def statements_dir(self) -> str:
+        return self.config["statements_dir"]
+
+    @property
+    def gemini_concurrency(self) -> int:
+        return self.config["gemini_concurrency"]
+
+    @property
+    def gemini_timeout(self) -> float:
+        return self.config["gemini_timeout"]
+
+    @property
+    def gemini_max_attempts(self) -> int:
+        return self.config["gemini_max_attempts"]
+
+    @property
+    def gemini_max_prompt_tokens(self) -> int:
+        return self.config["gemini_max_prompt_tokens"]
+
+    @property
+    def gemini_context_cache_ttl(self) -> float:
+        return self.config["gemini_context_cache_ttl"]
+
+    @property
+    def gemini_hedge(self) -> bool:
+        return self.config["gemini_hedge"]
+
+    @property
+    def gemini_endpoint(self) -> str:
+        return self.config["gemini_endpoint"]
+
+    @property
+    def verdict_cache_file(self) -> str:
+        return self.config["verdict_cache_file"]
+
+    @property
+    def verdict_cache_size(self) -> int:
+        return self.config["verdict_cache_size"]
+
+    @property
+    def verdict_cache_max_age(self) -> float:
+        return self.config["verdict_cache_max_age"]
+
+    @property
+    def sheet_read_quota(self) -> float:
+        return self.config["sheet_read_quota"]
+
+    @property
+    def sheet_write_quota(self) -> float:
+        return self.config["sheet_write_quota"]
+
+    @property
+    def sheet_backoff_max(self) -> float:
+        return self.config["sheet_backoff_max"]
+
+    @property
+    def journal_dir(self) -> str:
+        return self.config["journal_dir"]
+
+    @property
+    def lease_time(self) -> float:
+        return self.config["lease_time"]
+
+    @property
+    def claim_settle_time(self) -> float:
+        return self.config["claim_settle_time"]
+
+    @property
+    def themis_tests_dir(self) -> str:
+        return self.config["themis_tests_dir"]
+
+    @property
+    def export_mode(self) -> str:
+        return self.config["export_mode"]
+
+    @property
+    def export_page_size(self) -> int:
+        return self.config["export_page_size"]
+
+    @property
+    def export_pages_per_request(self) -> int:
+        return self.config["export_pages_per_request"]
+
+    @property
+    def export_manifest_file(self) -> str:
+        return self.config["export_manifest_file"]
+
+    @property
+    def metrics_file(self) -> str:
+        return self.config["metrics_file"]
+
+    @property
+    def metrics_trace_file(self) -> str:
+        return self.config["metrics_trace_file"]
+
+    @property
+    def metrics_port(self) -> int:
+        return self.config["metrics_port"]
+
+    @property
+    def metrics_interval(self) -> float:
+        return self.config["metrics_interval"]
+
+    @property
+    def native_compilers(self) -> Dict[str, Dict[str, Any]]:
+        return self.config["native_compilers"]
+
+    @property
+    def native_work_dir(self) -> str:
+        return self.config["native_work_dir"]
+
+    @property
+    def native_workers(self) -> int:
+        return self.config["native_workers"]
+
+    @property
+    def native_max_processes(self) -> int:
+        return self.config["native_max_processes"]
+
+    @property
+    def native_run_user(self) -> str:
+        return self.config["native_run_user"]
+
+    @property
+    def native_concurrency(self) -> int:
+        return self.config["native_concurrency"]
+
+    @property
+    def result_archive_dir(self) -> str:
+        return self.config["result_archive_dir"]
+
     @property
     def judge_id(self) -> str:
         return self.key["client_id"]
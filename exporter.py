@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from models import Submission
+from sheet_manager import SheetManager
+from sheet_backend import SheetBackend, GspreadBackend
+from problem_registry import ProblemRegistry
+from config import Config
+
+EXPORT_MODES = ["best", "latest"]
+
+
+class Exporter:
+    def __init__(self, sheet_backend: SheetBackend | None = None):
+        self.config = Config()
+        self.problem_registry = ProblemRegistry("data.json")
+
+        if self.config.export_mode not in EXPORT_MODES:
+            raise ValueError(f"Unknown export mode: {self.config.export_mode}")
+
+        if sheet_backend is None:
+            sheet_backend = GspreadBackend(
+                "key.json", self.config.sheet_id, self.config.contest_id
+            )
+
+        self.sheet_manager = SheetManager(sheet_backend, self.config.delay_time)
+
+        # Exported path -> content hash, to skip files that did not change
+        self.manifest_file = self.config.export_manifest_file
+        self.manifest: Dict[str, str] = self._load_manifest()
+
+    def run(self, output_dir: str = "Contestants"):
+        print("Reading submissions...")
+        selected = self._select_submissions()
+        print(f"Selected {len(selected)} submissions")
+
+        written = 0
+        exported = set()
+        for submission, _ in selected.values():
+            path = os.path.join(
+                output_dir,
+                submission.contestant,
+                f"{submission.problem_name}.{submission.extension}",
+            )
+            exported.add(path)
+
+            if self._write_if_changed(path, submission.source_code):
+                written += 1
+
+        # A contestant whose chosen submission changed language leaves a file
+        # with the old extension behind
+        removed = 0
+        for path in list(self.manifest):
+            if path.startswith(output_dir + os.sep) and path not in exported:
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+                del self.manifest[path]
+
+        self._save_manifest()
+        print(
+            f"Exported {len(exported)} files: {written} written, "
+            f"{len(exported) - written} unchanged, {removed} removed"
+        )
+
+    def _select_submissions(self) -> Dict[Tuple[str, str], Tuple[Submission, tuple]]:
+        selected: Dict[Tuple[str, str], Tuple[Submission, tuple]] = {}
+
+        for row, row_data in self._read_rows():
+            submission = self.sheet_manager.parse_submission(
+                row,
+                row_data,
+                self.problem_registry.problems,
+                self.config.code_extension,
+            )
+
+            if submission is None or not submission.contestant:
+                continue
+
+            rank = self._rank(row, row_data, submission)
+            key = (submission.contestant, submission.problem_id)
+
+            if key not in selected or rank > selected[key][1]:
+                selected[key] = (submission, rank)
+
+        return selected
+
+    def _read_rows(self):
+        page_size = self.config.export_page_size
+        pages_per_request = self.config.export_pages_per_request
+        row_count = self.sheet_manager.get_last_row()
+
+        first_row = 2
+        while first_row <= row_count:
+            row_ranges: List[Tuple[int, Optional[int]]] = []
+            for _ in range(pages_per_request):
+                if first_row > row_count:
+                    break
+
+                last_row = min(first_row + page_size - 1, row_count)
+                row_ranges.append((first_row, last_row))
+                first_row = last_row + 1
+
+            for block_row, block in self.sheet_manager.get_submission_blocks(
+                row_ranges, "I"
+            ):
+                for offset, row_data in enumerate(block):
+                    yield block_row + offset, row_data
+
+            print(f"Read {first_row - 2}/{row_count - 1} rows")
+
+    def _rank(self, row: int, row_data: List[str], submission: Submission) -> tuple:
+        if self.config.export_mode == "latest":
+            return (row,)
+
+        # Judged submissions by score, newest first on ties, then anything not
+        # judged yet by submission order
+        judged = submission.status == "Đã chấm"
+        try:
+            points = float(row_data[8]) if judged and len(row_data) >= 9 else 0.0
+        except ValueError:
+            points = 0.0
+
+        return (judged, points, row)
+
+    def _write_if_changed(self, path: str, source_code: str) -> bool:
+        digest = hashlib.sha256(source_code.encode("utf8")).hexdigest()
+        if self.manifest.get(path) == digest and os.path.exists(path):
+            return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf8") as f:
+            f.write(source_code)
+
+        self.manifest[path] = digest
+        return True
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            with open(self.manifest_file, "r", encoding="utf8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_file) or ".", exist_ok=True)
+
+        temp_file = self.manifest_file + ".tmp"
+        with open(temp_file, "w", encoding="utf8") as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_file, self.manifest_file)
+
+
+if __name__ == "__main__":
+    exporter = Exporter()
+    exporter.run()
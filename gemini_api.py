@@ -1,21 +1,198 @@
-import google.generativeai as genai
+import time
+import datetime
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from config import Config
 
-genai.configure(api_key=Config().gemini_api_key)
+MODEL_NAME = "gemini-2.0-flash"
+GENERATION_CONFIG = {"temperature": 0.2, "max_output_tokens": 1024}
 
-model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    generation_config={"temperature": 0.2, "max_output_tokens": 1024},
-)
+# Hedging only starts once this many answers were timed
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
 
+# Set up on the first call, importing the client library takes a while and
+# only contests with Gemini problems need it
+genai: Any = None
+config: Optional[Config] = None
+model: Any = None
+init_lock = threading.Lock()
 
-def call_gemini_api(prompt: str) -> str:
-    try:
-        response = model.generate_content(
-            contents=[{"parts": [{"text": prompt}]}],
+# Context key -> (model reading the cached context or None if it cannot be
+# cached, expiry time)
+cached_models: Dict[str, Tuple[Any, float]] = {}
+cache_lock = threading.Lock()
+
+# Requests run here so a hung one can be abandoned at its deadline, with room
+# for a hedged copy of each
+executor: Optional[ThreadPoolExecutor] = None
+latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+
+def initialize():
+    global genai, config, model, executor
+
+    with init_lock:
+        if model is not None:
+            return
+
+        import google.generativeai
+
+        genai = google.generativeai
+        config = Config()
+
+        if config.gemini_endpoint:
+            # A local stand-in speaking the REST API, for testing without the
+            # service
+            genai.configure(
+                api_key=config.gemini_api_key or "local",
+                transport="rest",
+                client_options={"api_endpoint": config.gemini_endpoint},
+            )
+        else:
+            genai.configure(api_key=config.gemini_api_key)
+
+        executor = ThreadPoolExecutor(
+            max_workers=config.gemini_concurrency * 2,
+            thread_name_prefix="gemini-call",
         )
+        model = genai.GenerativeModel(
+            model_name=MODEL_NAME,
+            generation_config=GENERATION_CONFIG,
+        )
+
 
-        return response.text if response and response.text else ""
+class GeminiAPIError(Exception):
+    pass
+
+
+def get_cached_model(context: str, context_key: str) -> Any:
+    ttl = config.gemini_context_cache_ttl
+
+    with cache_lock:
+        entry = cached_models.get(context_key)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+
+    try:
+        cached_content = genai.caching.CachedContent.create(
+            model=f"models/{MODEL_NAME}",
+            display_name=context_key[:128],
+            contents=[{"role": "user", "parts": [{"text": context}]}],
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        cached_model = genai.GenerativeModel.from_cached_content(
+            cached_content=cached_content, generation_config=GENERATION_CONFIG
+        )
     except Exception as e:
-        print(f"Error calling Gemini API: {e}")
-        return ""
+        # Usually a context below the model's minimum size for caching, which
+        # will not change until the statement does
+        print(f"Unable to cache Gemini context: {e}")
+        cached_model = None
+
+    with cache_lock:
+        # Recreated a little before the service drops it
+        cached_models[context_key] = (cached_model, time.time() + ttl * 0.9)
+
+    return cached_model
+
+
+def hedge_delay() -> float | None:
+    if not config.gemini_hedge or len(latencies) < HEDGE_MIN_SAMPLES:
+        return None
+
+    samples = sorted(latencies)
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def generate(
+    prompt: str, timeout: float | None, context: str, context_key: str | None
+) -> str:
+    # The context is the part shared by every request for a problem, sent
+    # through cached content when the service accepts it
+    cached_model = None
+    if context and context_key is not None:
+        cached_model = get_cached_model(context, context_key)
+
+    start = time.monotonic()
+
+    try:
+        if cached_model is not None:
+            response = cached_model.generate_content(
+                contents=[{"parts": [{"text": prompt}]}],
+                request_options={"timeout": timeout} if timeout else None,
+            )
+        else:
+            response = model.generate_content(
+                contents=[{"parts": [{"text": context + prompt}]}],
+                request_options={"timeout": timeout} if timeout else None,
+            )
+    except Exception:
+        if cached_model is not None:
+            with cache_lock:
+                cached_models.pop(context_key, None)
+        raise
+
+    if not response or not response.text:
+        raise GeminiAPIError("Gemini API returned empty response")
+
+    latencies.append(time.monotonic() - start)
+    return response.text
+
+
+def call_gemini_api(
+    prompt: str,
+    timeout: float | None = None,
+    context: str = "",
+    context_key: str | None = None,
+) -> str:
+    initialize()
+
+    start = time.monotonic()
+    deadline = start + timeout if timeout else None
+    delay = hedge_delay()
+
+    futures: List[Future] = [
+        executor.submit(generate, prompt, timeout, context, context_key)
+    ]
+    hedged = False
+
+    while True:
+        now = time.monotonic()
+        wait_time = deadline - now if deadline is not None else None
+        if not hedged and delay is not None:
+            hedge_time = start + delay - now
+            wait_time = hedge_time if wait_time is None else min(wait_time, hedge_time)
+
+        if wait_time is not None:
+            wait_time = max(0.0, wait_time)
+
+        done, _ = wait(futures, timeout=wait_time, return_when=FIRST_COMPLETED)
+
+        error = None
+        for future in done:
+            futures.remove(future)
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+
+        # A failed request is left to the caller's retries, only slow ones
+        # are hedged
+        if not futures:
+            raise error
+
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            for future in futures:
+                future.cancel()
+            raise TimeoutError(f"Gemini API did not answer within {timeout}s")
+
+        if not hedged and delay is not None and now >= start + delay:
+            print(f"Gemini API slower than {delay:.1f}s, sending a hedged request")
+            futures.append(
+                executor.submit(generate, prompt, timeout, context, context_key)
+            )
+            hedged = True
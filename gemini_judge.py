@@ -1,25 +1,57 @@
 import json
 import time
-from config import Config
+from typing import Dict, Tuple
 from models import JudgeResult, TestResult, ProblemData
 from gemini_api import call_gemini_api
+from metrics import Metrics
+
+# Rough size of a token, only used to keep prompts under the budget
+CHARS_PER_TOKEN = 4
+
+# Trimmed statements are cut to a multiple of this, so submissions of similar
+# length share the same context
+TRIM_STEP = 1000
 
 
 class GeminiJudge:
-    def __init__(self, result_messages: dict, round_digits: int):
+    def __init__(
+        self,
+        result_messages: dict,
+        round_digits: int,
+        max_attempts: int = 3,
+        timeout: float = 60,
+        retry_delay: float = 2,
+        metrics: Metrics | None = None,
+        max_prompt_tokens: int = 16000,
+    ):
         self.result_messages = result_messages
         self.round_digits = round_digits
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.metrics = metrics or Metrics()
+        self.max_prompt_tokens = max_prompt_tokens
+
+        # Context key -> instructions and statement shared by a problem's prompts
+        self.contexts: Dict[str, str] = {}
 
     def judge_submission(
         self, source_code: str, language: str, problem_data: ProblemData
     ) -> JudgeResult:
-        while True:
+        prompt = self._create_submission_prompt(source_code, language)
+        context, context_key = self._get_context(
+            problem_data, self.max_prompt_tokens - self._estimate_tokens(prompt)
+        )
+
+        for attempt in range(self.max_attempts):
             try:
-                prompt = self._create_judge_prompt(source_code, language, problem_data)
-                response = call_gemini_api(prompt)
+                with self.metrics.timer("gemini_request_seconds"):
+                    response = call_gemini_api(
+                        prompt, self.timeout, context, context_key
+                    )
 
-                if response is None:
-                    raise Exception("Gemini API returned None response")
+                if not response:
+                    raise Exception("Gemini API returned empty response")
 
                 result = self._parse_gemini_response(response, problem_data.time_limit)
                 if result is None:
@@ -27,26 +59,58 @@ class GeminiJudge:
 
                 return result
             except Exception as e:
+                self.metrics.inc("gemini_errors_total")
                 print(f"Error during Gemini judging: {e}")
 
-            time.sleep(Config().delay_time)
-            print("Retrying Gemini judging...")
+            if attempt + 1 < self.max_attempts:
+                time.sleep(self.retry_delay * 2**attempt)
+                print("Retrying Gemini judging...")
 
-    def _create_judge_prompt(
-        self, source_code: str, language: str, problem_data: ProblemData
-    ) -> str:
-        return f"""
-You are a competitive programming judge. Please analyze the following code submission for correctness and quality, based on the provided problem.
+        raise Exception(f"Gemini judging failed after {self.max_attempts} attempts")
 
-Problem Statement and Constraints:
-{problem_data.statement}
+    def _get_context(self, problem_data: ProblemData, budget: int) -> Tuple[str, str]:
+        statement = problem_data.statement
+        kind = "full"
+
+        overhead = self._estimate_tokens(self._create_context(problem_data, ""))
+        if overhead + self._estimate_tokens(statement) > budget:
+            summary = problem_data.summary
+            if summary and overhead + self._estimate_tokens(summary) <= budget:
+                statement = summary
+                kind = "summary"
+            else:
+                source = summary or statement
+                keep = max(0, budget - overhead) * CHARS_PER_TOKEN // TRIM_STEP
+                statement = source[: keep * TRIM_STEP] + "\n[...]"
+                kind = f"trimmed-{keep * TRIM_STEP}"
+
+            print(f"Prompt for {problem_data.name} over budget, using {kind} statement")
 
+        context_key = f"{problem_data.name}-{problem_data.statement_version}-{kind}"
+        if context_key not in self.contexts:
+            self.contexts[context_key] = self._create_context(problem_data, statement)
+
+        return self.contexts[context_key], context_key
+
+    def _estimate_tokens(self, text: str) -> int:
+        return len(text) // CHARS_PER_TOKEN + 1
+
+    def _create_submission_prompt(self, source_code: str, language: str) -> str:
+        return f"""
 Source Code:
 ```{language}
 {source_code}
-````
+```
+"""
+
+    def _create_context(self, problem_data: ProblemData, statement: str) -> str:
+        return f"""
+You are a competitive programming judge. Please analyze the code submission given at the end for correctness and quality, based on the provided problem.
+
+Problem Statement and Constraints:
+{statement}
 
-Please evaluate this code and provide your judgment in the following JSON format:
+Please evaluate the code and provide your judgment in the following JSON format:
 {{
     "total_points": <float between 0 and {problem_data.max_score}>,
     "verdict": "AC" | "WA" | "RE" | "TLE" | "CE" | "NOF",
@@ -0,0 +1,85 @@
+import json
+import time
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Answers like the Gemini REST API with a configurable latency, so judging and
+# tail latency can be tested offline by setting gemini_endpoint to this server
+
+
+def make_verdict() -> str:
+    return json.dumps(
+        {
+            "total_points": 100,
+            "verdict": "AC",
+            "explanation": "Local stand-in",
+            "test_cases": [
+                {"points": 6, "verdict": "AC", "estimated_execution_time": 15}
+                for _ in range(10)
+            ],
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--median", type=float, default=1.5)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-delay", type=float, default=30)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            # Context caching is refused so clients send prompts inline
+            if "cachedContents" in self.path:
+                self._reply(400, {"error": {"code": 400, "message": "Not cached"}})
+                return
+
+            if random.random() < args.failure_rate:
+                self._reply(503, {"error": {"code": 503, "message": "Unavailable"}})
+                return
+
+            if random.random() < args.tail_rate:
+                time.sleep(args.tail_delay)
+            else:
+                time.sleep(random.lognormvariate(0, 0.3) * args.median)
+
+            self._reply(
+                200,
+                {
+                    "candidates": [
+                        {
+                            "content": {
+                                "parts": [{"text": make_verdict()}],
+                                "role": "model",
+                            },
+                            "finishReason": "STOP",
+                            "index": 0,
+                        }
+                    ]
+                },
+            )
+
+        def _reply(self, code: int, body: dict):
+            data = json.dumps(body).encode("utf8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"Gemini stand-in listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,197 +1,618 @@
 import os
 import time
-from models import Submission, JudgeResult, ProblemData
-from themis_judge import ThemisJudge
-from gemini_judge import GeminiJudge
+from typing import Dict, Tuple
+from models import Submission, JudgeResult, TestResult, ProblemData
 from sheet_manager import SheetManager
+from sheet_backend import SheetBackend, GspreadBackend
+from rate_limiter import RateLimiter
+from submission_queue import SubmissionQueue, NEW, WAITING, JUDGING, EXPIRED
+from log_watcher import LogWatcher, LOG_READY
+from judge_pool import JUDGE_DONE
+from judge_registry import JudgeRegistry
+from verdict_cache import VerdictCache, source_hash, test_set_fingerprint
+from submission_journal import SubmissionJournal
+from scheduler import Scheduler
+from lease_manager import LeaseManager
+from problem_registry import ProblemRegistry
+from metrics import Metrics
+from result_archive import ResultArchive
 from config import Config
 
 
 class JudgeManager:
-    def __init__(self):
+    def __init__(self, sheet_backend: SheetBackend | None = None):
+        self.started = time.perf_counter()
         self.config = Config()
+        self.problem_registry = ProblemRegistry("data.json")
+
+        self.metrics = Metrics(
+            self.config.metrics_file,
+            self.config.metrics_trace_file,
+            self.config.metrics_port,
+            self.config.metrics_interval,
+        )
+
+        # Authenticates on the first request, not here
+        if sheet_backend is None:
+            sheet_backend = GspreadBackend(
+                "key.json", self.config.sheet_id, self.config.contest_id
+            )
+
         self.sheet_manager = SheetManager(
-            "key.json",
-            self.config.sheet_id,
-            self.config.contest_id,
+            sheet_backend,
             self.config.delay_time,
+            self.config.write_batch_size,
+            self.config.write_max_age,
+            RateLimiter(
+                self.config.sheet_read_quota,
+                self.config.sheet_write_quota,
+                self.config.delay_time,
+                self.config.sheet_backoff_max,
+                self.metrics,
+            ),
+            self.metrics,
+            ResultArchive(
+                os.path.join(self.config.result_archive_dir, self.config.contest_id)
+            ),
+        )
+
+        # Judges are imported and created the first time a problem needs them
+        self.judges = JudgeRegistry(self._notify_judged, self.metrics)
+        self.judges.register("Themis", self._create_themis_judge)
+        self.judges.register(
+            "Gemini", self._create_gemini_judge, self.config.gemini_concurrency
+        )
+        self.judges.register(
+            "Native", self._create_native_judge, self.config.native_concurrency
+        )
+
+        # Problem id -> last seen test set fingerprint, row -> verdict cache key
+        self.test_fingerprints: Dict[str, str] = {}
+        self.cache_keys: Dict[int, str] = {}
+
+        # Row -> (failed judging rounds, time the next round may start)
+        self.judge_failures: Dict[int, Tuple[int, float]] = {}
+
+        self.journal = SubmissionJournal(
+            os.path.join(self.config.journal_dir, f"{self.config.contest_id}.db")
+        )
+
+        self.submission_queue = SubmissionQueue(
+            self.sheet_manager,
+            self.config.judge_id,
+            self.problem_registry,
+            self.config.code_extension,
+            self.journal,
+            self.config.reset_time,
+            Scheduler(
+                self.problem_registry,
+                self.config.scheduling_policy,
+                self.config.scheduling_aging_time,
+                self.config.scheduling_weights,
+            ),
         )
 
-        self.themis_judge = ThemisJudge(
-            self.config.result_message, self.config.round_digits
+        self.lease_manager = LeaseManager(
+            self.config.judge_id,
+            self.config.lease_time,
+            self.config.claim_settle_time,
         )
 
-        self.gemini_judge = GeminiJudge(
+        self.log_watcher = LogWatcher(
+            "Submissions", self.config.watch_interval, self.config.log_settle_time
+        )
+
+        self.verdict_cache = VerdictCache(
+            self.config.verdict_cache_file,
+            self.config.verdict_cache_size,
+            self.config.verdict_cache_max_age,
+        )
+
+        # Row -> "Queuing" | "Waiting" | "Judging" for every submission in flight
+        self.in_flight: Dict[int, str] = self.journal.in_flight(self.config.judge_id)
+        self.submission_queue.taken.update(self.in_flight)
+
+        if self.in_flight:
+            print(f"Resumed {len(self.in_flight)} submissions from the journal")
+
+        self._report_startup("initialized")
+
+    def _create_themis_judge(self):
+        from themis_judge import ThemisJudge
+
+        return ThemisJudge(
+            self.config.result_message, self.config.round_digits, self.metrics
+        )
+
+    def _create_gemini_judge(self):
+        from gemini_judge import GeminiJudge
+
+        return GeminiJudge(
             self.config.result_message,
             self.config.round_digits,
+            self.config.gemini_max_attempts,
+            self.config.gemini_timeout,
+            self.config.delay_time,
+            self.metrics,
+            self.config.gemini_max_prompt_tokens,
         )
 
-        self.current_row = 0
-        self.judge_done = True
-        self.out_of_submission = False
-        self.last_reset = -self.config.reset_time
-        self.submission_status = ""
-        self.missed_rows = []
+    def _create_native_judge(self):
+        from native_judge import NativeJudge
 
-        print("Judge initialized successfully")
+        return NativeJudge(
+            self.config.result_message,
+            self.config.round_digits,
+            self.config.themis_tests_dir,
+            self.config.native_compilers,
+            self.config.native_work_dir,
+            self.config.native_workers,
+            self.metrics,
+            self.config.native_max_processes,
+            self.config.native_run_user,
+            # Hidden from programs: the tests, the key and other contestants' code
+            [
+                self.config.themis_tests_dir,
+                self.config.statements_dir,
+                self.config.journal_dir,
+                self.config.result_archive_dir,
+                self.config.verdict_cache_file,
+                "Submissions",
+                "Contestants",
+                "key.json",
+                "config.json",
+            ],
+        )
+
+    def _report_startup(self, step: str):
+        elapsed = time.perf_counter() - self.started
+        self.metrics.set_gauge("startup_seconds", elapsed, step=step)
+        print(f"Judge {step} in {elapsed:.2f}s")
+
+    def _notify_judged(self, row: int):
+        self.log_watcher.events.put((JUDGE_DONE, str(row)))
 
     def run(self):
         print("Starting judge...")
 
-        while True:
-            time.sleep(self.config.delay_time)
+        self.log_watcher.start()
+        self.metrics.start()
 
-            if self._should_reset():
-                self._reset_judge()
+        # Pull work right away after a restart
+        next_tick = time.time()
+        first_tick = True
 
-            if self.judge_done:
-                if not self._find_next_submission():
-                    continue
+        while True:
+            step = "events"
+
+            try:
+                events = self.log_watcher.wait(next_tick - time.time())
+
+                if events:
+                    with self.metrics.timer("loop_seconds", step="events"):
+                        self._handle_events(events)
+
+                if time.time() >= next_tick:
+                    step = "tick"
+                    with self.metrics.timer("loop_seconds", step="tick"):
+                        self._tick()
+                    next_tick = time.time() + self.config.delay_time
+
+                    if first_tick:
+                        self._report_startup("pulled work")
+                        first_tick = False
+
+                step = "flush"
+                self.sheet_manager.flush()
+                self.metrics.maybe_write_snapshot()
+            except Exception as e:
+                # One failed request must not stop the judge, the next tick
+                # picks up where this one stopped
+                self.metrics.inc("loop_errors_total", step=step)
+                print(f"Error in judge loop ({step}): {type(e).__name__}: {e}")
+
+                if step == "tick":
+                    next_tick = time.time() + self.config.delay_time
+
+    def _tick(self):
+        try:
+            self._tick_rows()
+        finally:
+            # Renewed even when a step failed, so a lease never runs out while
+            # its row is still ours
+            for row, lease in self.lease_manager.renewals(list(self.in_flight)):
+                self.sheet_manager.update_single_cell(row, 7, lease)
+
+    def _tick_rows(self):
+        # Rows of problems that were just added were skipped until now
+        if self.problem_registry.reload_if_changed():
+            self.submission_queue.skipped.clear()
+            self.submission_queue.request_audit()
+        self._collect_results()
+
+        # The snapshot must include our own pending writes before it is indexed
+        self.sheet_manager.flush()
+        with self.metrics.timer("loop_seconds", step="refresh"):
+            self.submission_queue.refresh()
+
+        self._fill_slots()
+        self._update_gauges()
+
+        if not self.in_flight:
+            print("Waiting for new submission...")
+            return
 
-            submission = self.sheet_manager.get_submission(
-                self.current_row, self.config.problems_data, self.config.code_extension
-            )
+        for row in list(self.in_flight):
+            submission = self.submission_queue.get(row)
 
             if submission is None:
-                self.out_of_submission = True
-                print("Waiting for new submission...")
+                self._release_submission(row, "Missing")
+                print(f"Submission #{row - 1} is no longer available")
                 continue
-            else:
-                self.out_of_submission = False
 
-            print(f"Submission #{self.current_row - 1}:", self.submission_status)
+            print(f"Submission #{row - 1}:", self.in_flight[row])
 
-            self._process_submission(submission)
+            try:
+                self._process_submission(submission)
+            except Exception as e:
+                # The other rows still move on, this one is tried again next tick
+                self.metrics.inc("loop_errors_total", step="row")
+                print(f"Error in submission #{row - 1}: {type(e).__name__}: {e}")
 
-    def _should_reset(self) -> bool:
-        return (
-            self.out_of_submission or self.judge_done
-        ) and time.time() > self.last_reset + self.config.reset_time
+    def _fill_slots(self):
+        while len(self.in_flight) < self.config.max_in_flight:
+            row = self.submission_queue.pop()
 
-    def _reset_judge(self):
-        print("Resetting the judge...")
+            if row is None:
+                break
 
-        self.missed_rows = self.sheet_manager.get_empty_rows()
+            print(f"Next submission found: #{row - 1}")
+            self._set_status(row, "Queuing")
 
-        if self.missed_rows:
-            self.current_row = self.missed_rows.pop(0)
-        else:
-            self.current_row = 2
+    def _update_gauges(self):
+        for state in [NEW, WAITING, JUDGING, EXPIRED]:
+            self.metrics.set_gauge(
+                "queue_depth", self.submission_queue.count(state), state=state
+            )
 
-        self.submission_status = "Queuing"
-        self.judge_done = False
-        self.last_reset = time.time()
+        self.metrics.set_gauge("in_flight", len(self.in_flight))
+        for judge_type, pool in self.judges.pools.items():
+            self.metrics.set_gauge(
+                "judge_pending", len(pool.pending), judge=judge_type.lower()
+            )
 
-        print("Judge resetted")
+    def _handle_events(self, events: list):
+        if any(kind == JUDGE_DONE for kind, _ in events):
+            self._collect_results()
 
-    def _find_next_submission(self) -> bool:
-        print("Finding next submission...")
+        rows = {}
+        for row in self.in_flight:
+            submission = self.submission_queue.get(row)
+            if submission is not None:
+                rows[submission.submission_name] = submission
 
-        while True:
-            if self.missed_rows:
-                self.current_row = self.missed_rows.pop(0)
-            else:
-                self.current_row += 1
+        for kind, name in events:
+            submission = rows.get(name)
+            if kind == JUDGE_DONE or submission is None:
+                continue
 
-            if self.sheet_manager.is_cell_empty(self.current_row, 7):
-                break
+            if self.in_flight.get(submission.row) == "Waiting":
+                self._start_judging(submission)
 
-        print("Next submission found")
-        self.judge_done = False
-        self.submission_status = "Queuing"
-        return True
+            if kind == LOG_READY and self.in_flight.get(submission.row) == "Judging":
+                self._complete_judging(submission)
+
+    def _set_status(self, row: int, status: str):
+        self.in_flight[row] = status
+        self.journal.record(row, status, self.config.judge_id)
+        self.metrics.trace(row, status)
+
+    def _release_submission(self, row: int, state: str, judge: str = ""):
+        self.submission_queue.release(row)
+        self.lease_manager.release(row)
+        self.in_flight.pop(row, None)
+        self.judge_failures.pop(row, None)
+        self.cache_keys.pop(row, None)
+        self.journal.record(row, state, judge or self.config.judge_id)
+        self.metrics.finish_trace(row, state, judge=judge or self.config.judge_id)
+
+    def _problem_data(self, submission: Submission) -> ProblemData | None:
+        if submission.problem_id not in self.problem_registry:
+            # Removed or renamed in data.json while the row was in flight
+            print(
+                f"Submission #{submission.row - 1}: "
+                f"problem {submission.problem_id} no longer exists"
+            )
+            self._release_submission(submission.row, "Missing")
+            return None
+
+        problem_data = self.problem_registry.get(submission.problem_id)
+
+        if problem_data.judge_type not in self.judges:
+            # Left alone until data.json changes, rather than retried each tick
+            print(
+                f"Submission #{submission.row - 1}: problem {submission.problem_id} "
+                f"has unknown judge type {problem_data.judge_type!r}, skipped"
+            )
+            self._release_submission(submission.row, "Rejected")
+            self.submission_queue.skip(submission.row)
+            return None
+
+        return problem_data
 
     def _process_submission(self, submission: Submission):
-        if submission.status == "":
+        if submission.status == "" or self.lease_manager.is_expired(submission):
             self._initialize_submission(submission)
-        elif submission.judge == self.config.judge_id:
-            if submission.status == "Đang chờ":
+        elif self.lease_manager.owns(submission):
+            if self.in_flight[submission.row] == "Claiming":
+                self._confirm_claim(submission)
+            elif submission.status == "Đang chờ":
                 self._start_judging(submission)
             elif submission.status == "Đang chấm":
                 self._complete_judging(submission)
+            elif submission.status == "Đã chấm":
+                self._release_submission(submission.row, "Judged")
         else:
-            self.judge_done = True
-            self.submission_status = "Skipped"
+            self._release_submission(submission.row, "Skipped", submission.judge)
             print("Submission is judged by another judge")
 
     def _initialize_submission(self, submission: Submission):
-        problem_data = ProblemData.from_dict(
-            self.config.problems_data[submission.problem_id]
-        )
+        problem_data = self._problem_data(submission)
+        if problem_data is None:
+            return
         judge_type = problem_data.judge_type
 
         self.sheet_manager.update_status(
-            submission.row, "Đang chờ", self.config.judge_id, judge_type
+            submission.row,
+            "Đang chờ",
+            self.lease_manager.claim(submission.row),
+            judge_type,
         )
 
-        if judge_type == "Themis":
+        self._set_status(submission.row, "Claiming")
+        print("Claim submission")
+
+    def _confirm_claim(self, submission: Submission):
+        if not self.lease_manager.is_settled(submission.row):
+            return
+
+        problem_data = self._problem_data(submission)
+        if problem_data is None:
+            return
+
+        if problem_data.judge_type == "Themis":
+            cache_key = self._cache_key(submission, problem_data)
+
+            if cache_key is not None:
+                cached_result = self.verdict_cache.get(cache_key)
+                if cached_result is not None:
+                    print("Reusing cached Themis verdict")
+                    self._finalize_judging(submission, cached_result, "Themis")
+                    return
+
+                self.cache_keys[submission.row] = cache_key
+
             os.makedirs("Submissions", exist_ok=True)
             with open(
                 f"Submissions/{submission.submission_name}", "w", encoding="utf8"
             ) as f:
                 f.write(submission.source_code)
 
-        self.submission_status = "Waiting"
+        self._set_status(submission.row, "Waiting")
         print("Change status to Waiting")
 
     def _start_judging(self, submission: Submission):
-        problem_data = ProblemData.from_dict(
-            self.config.problems_data[submission.problem_id]
-        )
+        problem_data = self._problem_data(submission)
+        if problem_data is None:
+            return
 
         if problem_data.judge_type == "Themis":
             if not os.path.exists(f"Submissions/{submission.submission_name}"):
                 self.sheet_manager.update_single_cell(submission.row, 6, "Đang chấm")
-                self.submission_status = "Judging"
+                self._set_status(submission.row, "Judging")
                 print("Change status to Judging")
         else:
             self.sheet_manager.update_single_cell(submission.row, 6, "Đang chấm")
-            self._judge_with_gemini(submission, problem_data)
+            self._set_status(submission.row, "Judging")
+            self._judge_in_pool(submission, problem_data)
 
     def _complete_judging(self, submission: Submission):
-        problem_data = ProblemData.from_dict(
-            self.config.problems_data[submission.problem_id]
-        )
+        problem_data = self._problem_data(submission)
+        if problem_data is None:
+            return
 
         if problem_data.judge_type == "Themis":
             self._complete_themis_judging(submission, problem_data)
+            return
+
+        pool = self.judges.pools.get(problem_data.judge_type)
+        if pool is not None and pool.is_pending(submission.row):
+            return
+
+        # Resumed after a restart or a failed judging round
+        _, retry_at = self.judge_failures.get(submission.row, (0, 0.0))
+        if time.time() >= retry_at:
+            self._judge_in_pool(submission, problem_data)
 
     def _complete_themis_judging(
         self, submission: Submission, problem_data: ProblemData
     ):
         log_file = f"Submissions/Logs/{submission.submission_name}.log"
 
-        if os.path.exists(log_file):
+        if not self.log_watcher.is_log_ready(submission.submission_name):
+            return
+
+        # A log that failed to parse stays ready and is read again after the
+        # backoff, since Themis does not write it a second time
+        _, retry_at = self.judge_failures.get(submission.row, (0, 0.0))
+        if time.time() < retry_at:
+            return
+
+        try:
             with open(log_file, "r", encoding="utf8") as f:
-                result = self.themis_judge.parse_log(f.read(), problem_data)
+                result = self.judges.get("Themis").parse_log(f, problem_data)
+        except Exception as e:
+            print(f"Error reading log {log_file}: {e}")
+            self._judging_failed(submission, "Themis", str(e))
+            if submission.row not in self.in_flight:
+                self.log_watcher.forget(submission.submission_name)
+            return
+
+        self.log_watcher.forget(submission.submission_name)
+        self._cache_result(submission, problem_data, result)
+        self._finalize_judging(submission, result, "Themis")
 
-            self._finalize_judging(submission, result)
+    def _judge_in_pool(self, submission: Submission, problem_data: ProblemData):
+        judge_type = problem_data.judge_type
 
-    def _judge_with_gemini(self, submission: Submission, problem_data: ProblemData):
-        if not self.gemini_judge:
-            print("Gemini API key not configured!")
+        cache_key = self._cache_key(submission, problem_data)
+        if cache_key is not None:
+            cached_result = self.verdict_cache.get(cache_key)
+            if cached_result is not None:
+                print(f"Reusing cached {judge_type} verdict")
+                self._finalize_judging(submission, cached_result, judge_type)
+                return
+
+            self.cache_keys[submission.row] = cache_key
+
+        try:
+            pool = self.judges.pool(judge_type)
+        except Exception as e:
+            # Loaded again on the row's next round, until it ends as JE
+            print(f"Error loading {judge_type} judge: {type(e).__name__}: {e}")
+            self._judging_failed(submission, judge_type, str(e))
             return
 
-        print("Judging with Gemini API...")
-        result = self.gemini_judge.judge_submission(
-            submission.source_code, submission.language, problem_data
+        print(f"Judging with {judge_type}...")
+        pool.submit(submission, problem_data)
+
+    def _collect_results(self):
+        for judge_type, pool in list(self.judges.pools.items()):
+            for submission, result, error in pool.completed():
+                if submission.row not in self.in_flight:
+                    continue
+
+                if result is None:
+                    self._judging_failed(submission, judge_type, error)
+                    continue
+
+                problem_data = self._problem_data(submission)
+                if problem_data is None:
+                    continue
+                self._cache_result(submission, problem_data, result)
+                self._finalize_judging(submission, result, judge_type)
+
+    def _judging_failed(self, submission: Submission, judge_type: str, error: str):
+        failures, _ = self.judge_failures.get(submission.row, (0, 0.0))
+        failures += 1
+        self.metrics.inc("judge_failures_total", judge=judge_type.lower())
+
+        if failures >= self.config.judge_max_rounds:
+            print(
+                f"Submission #{submission.row - 1}: "
+                f"{judge_type} judging failed {failures} times, giving up"
+            )
+            self._give_up_judging(submission, judge_type, error)
+            return
+
+        delay = self.config.judge_retry_delay * 2 ** (failures - 1)
+        self.judge_failures[submission.row] = (failures, time.time() + delay)
+        print(
+            f"Submission #{submission.row - 1}: "
+            f"{judge_type} judging will be retried in {delay:.0f}s"
+        )
+
+    def _give_up_judging(self, submission: Submission, judge_type: str, error: str):
+        message = self.config.result_message["JE"]
+        result = JudgeResult(
+            total_points=0,
+            max_execution_time=0,
+            final_message=message,
+            tests_result=[
+                TestResult(points=0, execution_time=0, message=f"{message}\n{error}")
+            ],
+        )
+
+        self._write_verdict(submission, result)
+        self._release_submission(submission.row, "Failed")
+
+    def _cache_result(
+        self, submission: Submission, problem_data: ProblemData, result: JudgeResult
+    ):
+        cache_key = self.cache_keys.pop(submission.row, None)
+        if cache_key is None:
+            cache_key = self._cache_key(submission, problem_data)
+
+        if cache_key is not None:
+            self.verdict_cache.put(
+                cache_key, self._cache_group(submission, problem_data), result
+            )
+
+    def _cache_key(
+        self, submission: Submission, problem_data: ProblemData
+    ) -> str | None:
+        # Gemini verdicts depend on the statement, every other judge on the tests
+        if problem_data.judge_type == "Gemini":
+            version = problem_data.statement_version
+        else:
+            version = self._test_fingerprint(submission, problem_data)
+
+            # Without its tests on this machine a verdict cannot be tied to them
+            if version is None:
+                return None
+
+        return self.verdict_cache.make_key(
+            problem_data.judge_type,
+            submission.problem_id,
+            version,
+            submission.language,
+            source_hash(
+                submission.source_code,
+                submission.language,
+                # Only the Gemini verdict is about the code rather than its output
+                normalize_whitespace=problem_data.judge_type == "Gemini",
+            ),
         )
-        self._finalize_judging(submission, result, is_gemini=True)
+
+    def _cache_group(self, submission: Submission, problem_data: ProblemData) -> str:
+        if problem_data.judge_type == "Gemini":
+            return submission.problem_id
+
+        return f"{problem_data.judge_type}:{submission.problem_id}"
+
+    def _test_fingerprint(
+        self, submission: Submission, problem_data: ProblemData
+    ) -> str | None:
+        fingerprint = test_set_fingerprint(
+            os.path.join(self.config.themis_tests_dir, problem_data.name)
+        )
+        if fingerprint is None:
+            return None
+
+        previous = self.test_fingerprints.get(submission.problem_id)
+        if previous is not None and previous != fingerprint:
+            print(f"Tests of {problem_data.name} changed, dropping cached verdicts")
+            self.verdict_cache.discard(self._cache_group(submission, problem_data))
+        self.test_fingerprints[submission.problem_id] = fingerprint
+
+        return fingerprint
 
     def _finalize_judging(
-        self, submission: Submission, result: JudgeResult, is_gemini: bool = False
+        self, submission: Submission, result: JudgeResult, judge_type: str
     ):
+        self._write_verdict(submission, result)
+        self._release_submission(submission.row, "Judged")
+
+        self.metrics.judged(judge_type)
+        print(f"Change status to Judged ({judge_type})")
+
+    def _write_verdict(self, submission: Submission, result: JudgeResult):
         self.sheet_manager.update_single_cell(submission.row, 6, "Đã chấm")
+        self.sheet_manager.update_single_cell(submission.row, 7, self.config.judge_id)
         self.sheet_manager.update_results(
             submission.row, result, self.config.round_digits
         )
 
-        self.judge_done = True
-        self.submission_status = "Judged"
-
-        judge_type = "Gemini" if is_gemini else "Themis"
-        print(f"Change status to Judged ({judge_type})")
-
 
 if __name__ == "__main__":
     judge = JudgeManager()
@@ -0,0 +1,58 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from models import Submission, JudgeResult, ProblemData
+
+JUDGE_DONE = "judged"
+
+
+class JudgePool:
+    def __init__(
+        self,
+        judge: Any,
+        max_workers: int,
+        on_done: Optional[Callable[[int], None]] = None,
+        name: str = "judge",
+    ):
+        # Any judge with judge_submission(source_code, language, problem_data)
+        self.judge = judge
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self.on_done = on_done
+        self.pending: Dict[int, Tuple[Submission, Future]] = {}
+
+    def submit(self, submission: Submission, problem_data: ProblemData):
+        if submission.row in self.pending:
+            return
+
+        future = self.executor.submit(
+            self.judge.judge_submission,
+            submission.source_code,
+            submission.language,
+            problem_data,
+        )
+        self.pending[submission.row] = (submission, future)
+
+        if self.on_done is not None:
+            future.add_done_callback(lambda _: self.on_done(submission.row))
+
+    def is_pending(self, row: int) -> bool:
+        return row in self.pending
+
+    def completed(self) -> List[Tuple[Submission, Optional[JudgeResult], str]]:
+        # (submission, result or None if judging failed, error message)
+        results = []
+
+        for row, (submission, future) in list(self.pending.items()):
+            if not future.done():
+                continue
+
+            del self.pending[row]
+
+            try:
+                results.append((submission, future.result(), ""))
+            except Exception as e:
+                print(f"Submission #{row - 1}: {e}")
+                results.append((submission, None, str(e)))
+
+        return results
@@ -0,0 +1,63 @@
+import time
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from judge_pool import JudgePool
+from metrics import Metrics
+
+
+class JudgeRegistry:
+    def __init__(
+        self,
+        on_done: Optional[Callable[[int], None]] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.on_done = on_done
+        self.metrics = metrics or Metrics()
+
+        # Judge type -> (factory, background workers or 0 to judge in the loop)
+        self.factories: Dict[str, Tuple[Callable[[], Any], int]] = {}
+        self.judges: Dict[str, Any] = {}
+        self.pools: Dict[str, JudgePool] = {}
+        self.lock = threading.Lock()
+
+    def register(
+        self, judge_type: str, factory: Callable[[], Any], concurrency: int = 0
+    ):
+        self.factories[judge_type] = (factory, concurrency)
+
+    def __contains__(self, judge_type: str) -> bool:
+        return judge_type in self.factories
+
+    def get(self, judge_type: str) -> Any:
+        with self.lock:
+            judge = self.judges.get(judge_type)
+            if judge is not None:
+                return judge
+
+            # Backends are only imported and set up once a problem needs them,
+            # so a contest never pays for judges it does not use
+            factory, _ = self.factories[judge_type]
+            start = time.perf_counter()
+            judge = factory()
+            elapsed = time.perf_counter() - start
+
+            self.judges[judge_type] = judge
+
+        self.metrics.set_gauge("judge_load_seconds", elapsed, judge=judge_type.lower())
+        print(f"Loaded {judge_type} judge in {elapsed:.2f}s")
+
+        return judge
+
+    def pool(self, judge_type: str) -> JudgePool:
+        pool = self.pools.get(judge_type)
+        if pool is None:
+            judge = self.get(judge_type)
+            pool = JudgePool(
+                judge,
+                self.factories[judge_type][1],
+                self.on_done,
+                judge_type.lower(),
+            )
+            self.pools[judge_type] = pool
+
+        return pool
@@ -0,0 +1,81 @@
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from models import Submission
+
+
+@dataclass
+class Lease:
+    token: str
+    expires_at: float
+    claimed_at: float
+
+
+def parse_lease(value: str) -> Tuple[str, str, float]:
+    # The judge cell holds "<judge id>|<token>|<expiry>", or only the judge id
+    # for rows claimed without a lease
+    judge, _, lease = value.partition("|")
+    token, _, expires_at = lease.partition("|")
+
+    try:
+        return judge, token, float(expires_at)
+    except ValueError:
+        return judge, token, 0.0
+
+
+class LeaseManager:
+    def __init__(self, judge_id: str, lease_time: float, settle_time: float):
+        self.judge_id = judge_id
+        self.lease_time = lease_time
+        self.settle_time = settle_time
+        self.leases: Dict[int, Lease] = {}
+
+    def claim(self, row: int) -> str:
+        now = time.time()
+        self.leases[row] = Lease(uuid.uuid4().hex[:12], now + self.lease_time, now)
+
+        return self.value(row)
+
+    def value(self, row: int) -> str:
+        lease = self.leases[row]
+        return f"{self.judge_id}|{lease.token}|{int(lease.expires_at)}"
+
+    def owns(self, submission: Submission) -> bool:
+        if submission.judge != self.judge_id:
+            return False
+
+        lease = self.leases.get(submission.row)
+        if lease is None:
+            # Claimed before a restart, keep the lease that is on the sheet
+            self.leases[submission.row] = Lease(
+                submission.lease_token, submission.lease_expires_at, 0.0
+            )
+            return True
+
+        return submission.lease_token == lease.token
+
+    def is_settled(self, row: int) -> bool:
+        # Another judge working from an older snapshot may still overwrite a
+        # fresh claim, so it only counts once it survived this long
+        return time.time() >= self.leases[row].claimed_at + self.settle_time
+
+    def is_expired(self, submission: Submission) -> bool:
+        return 0 < submission.lease_expires_at < time.time()
+
+    def renewals(self, rows: List[int]) -> List[Tuple[int, str]]:
+        now = time.time()
+        renewed = []
+
+        for row in rows:
+            lease = self.leases.get(row)
+            if lease is None or lease.expires_at > now + self.lease_time / 2:
+                continue
+
+            lease.expires_at = now + self.lease_time
+            renewed.append((row, self.value(row)))
+
+        return renewed
+
+    def release(self, row: int):
+        self.leases.pop(row, None)
@@ -0,0 +1,176 @@
+import os
+import queue
+import struct
+import threading
+import time
+import ctypes
+import ctypes.util
+from typing import Dict, List, Set, Tuple
+
+SOURCE_CONSUMED = "consumed"
+LOG_READY = "log"
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+
+
+class LogWatcher:
+    def __init__(
+        self,
+        submissions_dir: str = "Submissions",
+        poll_interval: float = 0.2,
+        settle_time: float = 0.05,
+    ):
+        self.submissions_dir = submissions_dir
+        self.logs_dir = os.path.join(submissions_dir, "Logs")
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+
+        self.events: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self.ready_logs: Set[str] = set()
+        self.lock = threading.Lock()
+        self.mode = ""
+
+    def start(self):
+        os.makedirs(self.logs_dir, exist_ok=True)
+
+        for file in os.listdir(self.logs_dir):
+            if file.endswith(".log"):
+                self._emit_log_if_stable(file)
+
+        inotify_fd = self._init_inotify()
+
+        if inotify_fd is not None:
+            self.mode = "inotify"
+            target = self._watch_inotify
+            args = (inotify_fd,)
+        else:
+            self.mode = "polling"
+            target = self._watch_polling
+            args = ()
+
+        threading.Thread(target=target, args=args, daemon=True).start()
+        print(f"Watching {self.submissions_dir} ({self.mode})")
+
+    def wait(self, timeout: float) -> List[Tuple[str, str]]:
+        try:
+            events = [self.events.get(timeout=max(timeout, 0))]
+        except queue.Empty:
+            return []
+
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def is_log_ready(self, submission_name: str) -> bool:
+        with self.lock:
+            return submission_name in self.ready_logs
+
+    def forget(self, submission_name: str):
+        with self.lock:
+            self.ready_logs.discard(submission_name)
+
+    def _init_inotify(self):
+        library = ctypes.util.find_library("c")
+        if library is None:
+            return None
+
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            fd = libc.inotify_init()
+        except (OSError, AttributeError):
+            return None
+
+        if fd < 0:
+            return None
+
+        watches = [
+            (self.submissions_dir, IN_DELETE | IN_MOVED_FROM),
+            (self.logs_dir, IN_CLOSE_WRITE | IN_MOVED_TO),
+        ]
+        for path, mask in watches:
+            if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+                os.close(fd)
+                return None
+
+        return fd
+
+    def _watch_inotify(self, fd: int):
+        header_size = struct.calcsize("iIII")
+
+        while True:
+            buffer = os.read(fd, 64 * 1024)
+
+            offset = 0
+            while offset + header_size <= len(buffer):
+                _, mask, _, length = struct.unpack_from("iIII", buffer, offset)
+                name = buffer[offset + header_size : offset + header_size + length]
+                name = os.fsdecode(name.rstrip(b"\0"))
+                offset += header_size + length
+
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.events.put((SOURCE_CONSUMED, name))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and name.endswith(".log"):
+                    self._emit_log_if_stable(name)
+
+    def _watch_polling(self):
+        sources = set(self._list_sources())
+        log_sizes: Dict[str, Tuple[int, float]] = {}
+
+        while True:
+            time.sleep(self.poll_interval)
+
+            current_sources = set(self._list_sources())
+            for name in sources - current_sources:
+                self.events.put((SOURCE_CONSUMED, name))
+            sources = current_sources
+
+            for file in os.listdir(self.logs_dir):
+                if not file.endswith(".log") or self.is_log_ready(file[:-4]):
+                    continue
+
+                stat = self._stat(file)
+                if stat is None:
+                    continue
+
+                # Only report a log once it stopped growing between two polls
+                if log_sizes.get(file) == stat and stat[0] > 0:
+                    self._mark_ready(file)
+                    log_sizes.pop(file)
+                else:
+                    log_sizes[file] = stat
+
+    def _list_sources(self) -> List[str]:
+        return [
+            file
+            for file in os.listdir(self.submissions_dir)
+            if os.path.isfile(os.path.join(self.submissions_dir, file))
+        ]
+
+    def _emit_log_if_stable(self, file: str):
+        before = self._stat(file)
+        time.sleep(self.settle_time)
+        after = self._stat(file)
+
+        if before is not None and before == after and after[0] > 0:
+            self._mark_ready(file)
+
+    def _mark_ready(self, file: str):
+        submission_name = file[:-4]
+
+        with self.lock:
+            self.ready_logs.add(submission_name)
+
+        self.events.put((LOG_READY, submission_name))
+
+    def _stat(self, file: str):
+        try:
+            stat = os.stat(os.path.join(self.logs_dir, file))
+        except OSError:
+            return None
+
+        return stat.st_size, stat.st_mtime
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds in seconds, from a fast sheet call to a slow Gemini round
+LATENCY_BUCKETS = [
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600,
+]  # fmt: skip
+
+RATE_WINDOW = 60
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th value
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target and seen > 0:
+                return bound
+
+        return float("inf") if self.count else 0.0
+
+
+class Metrics:
+    def __init__(
+        self,
+        snapshot_file: str = "",
+        trace_file: str = "",
+        port: int = 0,
+        interval: float = 10,
+    ):
+        self.snapshot_file = snapshot_file
+        self.trace_file = trace_file
+        self.port = port
+        self.interval = interval
+
+        self.histograms: Dict[MetricKey, Histogram] = {}
+        self.counters: Dict[MetricKey, float] = {}
+        self.gauges: Dict[MetricKey, float] = {}
+        self.judged_at: Deque[float] = deque()
+
+        # Row -> transitions of a submission since it was picked up
+        self.traces: Dict[int, dict] = {}
+
+        self.last_snapshot = 0.0
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        if not self.port:
+            return
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        threading.Thread(
+            target=self.server.serve_forever, name="metrics", daemon=True
+        ).start()
+        print(f"Serving metrics on http://127.0.0.1:{self.port}/metrics")
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def judged(self, judge_type: str):
+        self.inc("judged_total", judge=judge_type)
+        with self.lock:
+            self.judged_at.append(time.time())
+
+    def judged_per_minute(self) -> float:
+        now = time.time()
+        with self.lock:
+            while self.judged_at and self.judged_at[0] < now - RATE_WINDOW:
+                self.judged_at.popleft()
+            return len(self.judged_at) * 60 / RATE_WINDOW
+
+    def trace(self, row: int, state: str):
+        now = time.time()
+        trace = self.traces.setdefault(
+            row, {"row": row, "started_at": now, "events": []}
+        )
+
+        # Time spent in the previous state is that stage's latency
+        if trace["events"]:
+            previous, at = trace["events"][-1]
+            self.observe(
+                "stage_seconds", now - trace["started_at"] - at, stage=previous
+            )
+
+        trace["events"].append((state, round(now - trace["started_at"], 3)))
+
+    def finish_trace(self, row: int, state: str, **fields):
+        self.trace(row, state)
+        trace = self.traces.pop(row)
+        total = trace["events"][-1][1]
+
+        if state == "Judged":
+            self.observe("submission_seconds", total)
+
+        if not self.trace_file:
+            return
+
+        trace.update(fields, state=state, total=total)
+        os.makedirs(os.path.dirname(self.trace_file) or ".", exist_ok=True)
+        with open(self.trace_file, "a", encoding="utf8") as f:
+            f.write(json.dumps(trace, ensure_ascii=False) + "\n")
+
+    def maybe_write_snapshot(self):
+        if not self.snapshot_file or time.time() < self.last_snapshot + self.interval:
+            return
+
+        self.last_snapshot = time.time()
+        os.makedirs(os.path.dirname(self.snapshot_file) or ".", exist_ok=True)
+
+        temp_file = self.snapshot_file + ".tmp"
+        with open(temp_file, "w", encoding="utf8") as f:
+            json.dump(self.snapshot(), f, indent=4)
+        os.replace(temp_file, self.snapshot_file)
+
+    def snapshot(self) -> dict:
+        judged_per_minute = self.judged_per_minute()
+
+        with self.lock:
+            return {
+                "time": time.time(),
+                "judged_per_minute": judged_per_minute,
+                "counters": {
+                    self._format_key(key): value
+                    for key, value in sorted(self.counters.items())
+                },
+                "gauges": {
+                    self._format_key(key): value
+                    for key, value in sorted(self.gauges.items())
+                },
+                "histograms": {
+                    self._format_key(key): {
+                        "count": histogram.count,
+                        "mean": histogram.sum / histogram.count,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "p99": histogram.quantile(0.99),
+                    }
+                    for key, histogram in sorted(self.histograms.items())
+                    if histogram.count
+                },
+            }
+
+    def render(self) -> str:
+        judged_per_minute = self.judged_per_minute()
+        lines = [
+            "# TYPE tloj_judged_per_minute gauge",
+            f"tloj_judged_per_minute {judged_per_minute}",
+        ]
+
+        with self.lock:
+            for kind, values in [("counter", self.counters), ("gauge", self.gauges)]:
+                for name, group in self._group(values):
+                    lines.append(f"# TYPE tloj_{name} {kind}")
+                    for key, value in group:
+                        lines.append(f"tloj_{self._format_key(key)} {value}")
+
+            for name, group in self._group(self.histograms):
+                lines.append(f"# TYPE tloj_{name} histogram")
+                for (_, labels), histogram in group:
+                    cumulative = 0
+                    for bound, count in zip(
+                        histogram.buckets + [float("inf")], histogram.counts
+                    ):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else str(bound)
+                        bucket_key = (f"{name}_bucket", labels + (("le", le),))
+                        lines.append(
+                            f"tloj_{self._format_key(bucket_key)} {cumulative}"
+                        )
+
+                    lines.append(
+                        f"tloj_{self._format_key((f'{name}_sum', labels))} {histogram.sum}"
+                    )
+                    lines.append(
+                        f"tloj_{self._format_key((f'{name}_count', labels))} {histogram.count}"
+                    )
+
+        return "\n".join(lines) + "\n"
+
+    def _group(self, values: dict) -> List[Tuple[str, list]]:
+        groups: Dict[str, list] = {}
+        for key in sorted(values):
+            groups.setdefault(key[0], []).append((key, values[key]))
+
+        return list(groups.items())
+
+    def _key(self, name: str, labels: Dict[str, str]) -> MetricKey:
+        return name, tuple(sorted(labels.items()))
+
+    def _format_key(self, key: MetricKey) -> str:
+        name, labels = key
+        if not labels:
+            return name
+
+        return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
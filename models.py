@@ -1,3 +1,4 @@
+import hashlib
 from dataclasses import dataclass
 from typing import List, Dict, Any
 
@@ -28,6 +29,8 @@ class Submission:
     source_code: str
     status: str
     judge: str
+    lease_token: str = ""
+    lease_expires_at: float = 0.0
 
     @property
     def submission_name(self) -> str:
@@ -37,13 +40,22 @@ class Submission:
 @dataclass
 class ProblemData:
     name: str
-    judge_type: str  # "Themis" or "Gemini"
+    judge_type: str  # "Themis", "Gemini" or "Native"
     max_score: float
     time_limit: float
     memory_limit: int
     input_file: str
     output_file: str
     statement: str = ""
+    summary: str = ""
+
+    @property
+    def statement_version(self) -> str:
+        # Everything from the problem that ends up in the Gemini prompt
+        content = (
+            f"{self.max_score}\0{self.time_limit}\0{self.statement}\0{self.summary}"
+        )
+        return hashlib.sha256(content.encode("utf8")).hexdigest()
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "ProblemData":
@@ -56,4 +68,5 @@ class ProblemData:
             input_file=data.get("input_file", "stdin"),
             output_file=data.get("output_file", "stdout"),
             statement=data.get("statement", ""),
+            summary=data.get("summary", ""),
         )
@@ -3,9 +3,15 @@ import json
 import gspread
 import mosspy
 import shutil
+from similarity import SimilarityIndex, cluster
 
 userid = 908497776
 
+# Only submissions this similar to another one are sent to MOSS, in at most
+# this many groups per problem
+SIMILARITY_THRESHOLD = 0.5
+MOSS_CLUSTERS = 10
+
 
 def main():
     with open("data.json", "r", encoding="utf8") as f:
@@ -80,8 +86,31 @@ def main():
 
         print("Checking " + problem + " submissions...")
 
+        index = SimilarityIndex()
+        for file in os.listdir():
+            with open(file, "r", encoding="utf8", errors="replace") as f:
+                index.add(file, f.read())
+
+        pairs = index.pairs()
+        with open("similarity.txt", "w", encoding="utf8") as f:
+            for pair in pairs:
+                f.write(f"{pair.score:.2f}\t{pair.first}\t{pair.second}\n")
+
+        clusters = cluster(pairs, SIMILARITY_THRESHOLD)[:MOSS_CLUSTERS]
+        if not clusters:
+            print("No similar submissions found")
+            os.chdir("..")
+            continue
+
+        print(
+            f"Found {len(pairs)} similar pairs, "
+            f"sending {sum(len(files) for files in clusters)} files to MOSS"
+        )
+
         moss = mosspy.Moss(userid, "cpp")
-        moss.addFilesByWildcard("*")
+        for files in clusters:
+            for file in files:
+                moss.addFile(file)
         url = moss.send()
         moss_url.append({"problem": problem, "url": url})
 
@@ -0,0 +1,424 @@
+import os
+import pwd
+import math
+import shlex
+import stat
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from models import JudgeResult, TestResult, ProblemData
+from themis_judge import MAX_CE_MESSAGE_LENGTH
+from metrics import Metrics
+
+COMPILE_TIMEOUT = 30
+MAX_OUTPUT_SIZE = 64 * 1024 * 1024
+SANDBOX_TOOLS = ["prlimit", "unshare", "setpriv"]
+
+
+@dataclass
+class RunResult:
+    cpu_time: float
+    exit_code: int
+    timed_out: bool
+
+
+class NativeJudge:
+    def __init__(
+        self,
+        result_messages: dict,
+        round_digits: int,
+        tests_dir: str,
+        compilers: Dict[str, dict],
+        work_dir: str,
+        workers: int = 0,
+        metrics: Optional[Metrics] = None,
+        max_processes: int = 256,
+        run_user: str = "nobody",
+        hidden_paths: Optional[List[str]] = None,
+    ):
+        missing = [tool for tool in SANDBOX_TOOLS if shutil.which(tool) is None]
+        if missing:
+            raise RuntimeError(
+                f"The native judge needs {', '.join(missing)} from util-linux"
+            )
+
+        # Switching users and creating namespaces both need root
+        if os.geteuid() != 0:
+            raise RuntimeError("The native judge must run as root to sandbox programs")
+
+        try:
+            user = pwd.getpwnam(run_user)
+        except KeyError:
+            raise RuntimeError(f"Unknown native run user: {run_user}")
+
+        if user.pw_uid == 0:
+            raise RuntimeError("The native run user must not be root")
+
+        self.result_messages = result_messages
+        self.round_digits = round_digits
+        self.tests_dir = tests_dir
+        self.compilers = compilers
+        self.work_dir = work_dir
+        self.max_processes = max_processes
+        self.run_uid = user.pw_uid
+        self.run_gid = user.pw_gid
+        self.hidden_paths = [os.path.abspath(path) for path in hidden_paths or []]
+        self.metrics = metrics or Metrics()
+
+        # Programs reach their build through the work dir, which must be
+        # searchable by anyone but not listable
+        os.makedirs(self.work_dir, exist_ok=True)
+        os.chmod(self.work_dir, 0o711)
+        path = os.path.abspath(self.work_dir)
+        while True:
+            if not os.stat(path).st_mode & stat.S_IXOTH:
+                raise RuntimeError(
+                    f"The native work dir is not reachable by {run_user} through {path}"
+                )
+            if path == os.path.dirname(path):
+                break
+            path = os.path.dirname(path)
+
+        self.sandbox_time = self._sandbox_time()
+
+        # Shared by every submission, so tests never run on more cores than this
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1, thread_name_prefix="native"
+        )
+
+    def judge_submission(
+        self, source_code: str, language: str, problem_data: ProblemData
+    ) -> JudgeResult:
+        tests = self._find_tests(problem_data.name)
+        if not tests:
+            raise Exception(f"No tests found for {problem_data.name}")
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix="build-", dir=self.work_dir)
+        os.chown(build_dir, self.run_uid, self.run_gid)
+
+        try:
+            compiler, error = self._compile(source_code, language, build_dir)
+            if error is not None:
+                return self._compilation_error(error)
+
+            with self.metrics.timer("native_tests_seconds"):
+                tests_result = list(
+                    self.executor.map(
+                        lambda test: self._run_test(
+                            compiler, build_dir, test, problem_data, len(tests)
+                        ),
+                        tests,
+                    )
+                )
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+        return self._build_result(tests_result)
+
+    def _find_tests(self, problem_name: str) -> List[Tuple[str, str]]:
+        # Same layout as Themis: <tests dir>/<problem>/<test>/<problem>.INP|.OUT
+        problem_dir = os.path.join(self.tests_dir, problem_name)
+        if not os.path.isdir(problem_dir):
+            return []
+
+        tests = []
+        for test in sorted(os.listdir(problem_dir)):
+            test_dir = os.path.join(problem_dir, test)
+            if not os.path.isdir(test_dir):
+                continue
+
+            files = {
+                os.path.splitext(name)[1].lower(): os.path.join(test_dir, name)
+                for name in os.listdir(test_dir)
+            }
+            if ".inp" in files and ".out" in files:
+                tests.append((files[".inp"], files[".out"]))
+
+        return tests
+
+    def _compile(
+        self, source_code: str, language: str, build_dir: str
+    ) -> Tuple[dict, Optional[str]]:
+        compiler = self.compilers.get(language)
+        if compiler is None:
+            return {}, f"Unsupported language: {language}"
+
+        with open(
+            os.path.join(build_dir, compiler["source"]), "w", encoding="utf8"
+        ) as f:
+            f.write(source_code)
+
+        if not compiler.get("compile"):
+            return compiler, None
+
+        try:
+            with self.metrics.timer("native_compile_seconds"):
+                process = subprocess.run(
+                    self._sandbox(
+                        self._command(compiler["compile"], build_dir),
+                        build_dir,
+                        build_dir,
+                    ),
+                    cwd=build_dir,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    timeout=COMPILE_TIMEOUT,
+                    env=self._environment(),
+                )
+        except subprocess.TimeoutExpired:
+            return compiler, "Compilation timed out"
+        except OSError as e:
+            return compiler, str(e)
+
+        if process.returncode != 0:
+            return compiler, process.stdout.decode("utf8", errors="replace")
+
+        return compiler, None
+
+    def _run_test(
+        self,
+        compiler: dict,
+        build_dir: str,
+        test: Tuple[str, str],
+        problem_data: ProblemData,
+        test_count: int,
+    ) -> TestResult:
+        input_path, answer_path = test
+        test_dir = tempfile.mkdtemp(prefix="test-", dir=build_dir)
+        os.chown(test_dir, self.run_uid, self.run_gid)
+        output_path = os.path.join(test_dir, "stdout")
+
+        if problem_data.input_file != "stdin":
+            shutil.copyfile(input_path, os.path.join(test_dir, problem_data.input_file))
+        if problem_data.output_file != "stdout":
+            output_path = os.path.join(test_dir, problem_data.output_file)
+
+        with open(input_path, "rb") as stdin, open(
+            os.path.join(test_dir, "stdout"), "wb"
+        ) as stdout:
+            run = self._execute(
+                self._command(compiler["run"], build_dir),
+                build_dir,
+                test_dir,
+                stdin,
+                stdout,
+                problem_data,
+                compiler.get("limit_memory", True),
+            )
+
+        execution_time = round(run.cpu_time * 1000)
+
+        if run.timed_out or run.cpu_time > problem_data.time_limit:
+            message = self.result_messages["TLE"]
+            execution_time = round(problem_data.time_limit * 1000)
+        elif run.exit_code != 0:
+            message = self.result_messages["RE"] + f" (exit code: {run.exit_code})"
+        elif not os.path.exists(output_path):
+            message = self.result_messages["NOF"]
+        elif self._same_output(output_path, answer_path):
+            message = self.result_messages["AC"]
+        else:
+            message = self.result_messages["WA"]
+
+        points = 0.0
+        if message == self.result_messages["AC"]:
+            points = problem_data.max_score / test_count
+
+        return TestResult(
+            points=round(points, self.round_digits),
+            execution_time=execution_time,
+            message=message,
+        )
+
+    def _execute(
+        self,
+        command: List[str],
+        build_dir: str,
+        cwd: str,
+        stdin,
+        stdout,
+        problem_data: ProblemData,
+        limit_memory: bool,
+    ) -> RunResult:
+        cpu_limit = math.ceil(problem_data.time_limit) + 1
+        memory_limit = problem_data.memory_limit * 1024 * 1024
+
+        # Limits are set by prlimit before it execs the program, as preexec_fn
+        # is unsafe with the executor's threads. The process limit counts every
+        # process of the run user, across all programs running at once
+        limits = [
+            f"--cpu={cpu_limit}:{cpu_limit + 1}",
+            f"--fsize={MAX_OUTPUT_SIZE}",
+            f"--nproc={self.max_processes}",
+        ]
+        if limit_memory:
+            limits.append(f"--as={memory_limit}")
+
+        try:
+            process = subprocess.Popen(
+                self._sandbox(["prlimit", *limits, "--", *command], build_dir, cwd),
+                cwd=cwd,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+                env=self._environment(),
+            )
+        except OSError:
+            return RunResult(cpu_time=0.0, exit_code=-1, timed_out=False)
+
+        # CPU time is capped by the rlimit, this catches programs that sleep or
+        # block instead
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        timer = threading.Timer(problem_data.time_limit * 2 + 1, kill)
+        timer.start()
+
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        # The sandbox shell reports a program killed by a signal like shells do
+        if process.returncode > 128:
+            process.returncode = 128 - process.returncode
+
+        cpu_time = max(usage.ru_utime + usage.ru_stime - self.sandbox_time, 0.0)
+
+        return RunResult(
+            cpu_time=cpu_time,
+            exit_code=process.returncode,
+            timed_out=timed_out.is_set() or process.returncode == -signal.SIGXCPU,
+        )
+
+    def _same_output(self, output_path: str, answer_path: str) -> bool:
+        # Whitespace is ignored, like the default Themis comparison
+        with open(output_path, "rb") as output, open(answer_path, "rb") as answer:
+            return output.read().split() == answer.read().split()
+
+    def _sandbox(self, command: List[str], build_dir: str, cwd: str) -> List[str]:
+        build_dir = os.path.abspath(build_dir)
+        work_dir = os.path.abspath(self.work_dir)
+
+        # In its own mount namespace the work dir is replaced by an empty one
+        # holding only this build, so other submissions cannot be reached
+        steps = [
+            f"exec 3<{shlex.quote(build_dir)}",
+            f"mount -t tmpfs -o mode=711 none {shlex.quote(work_dir)}",
+            f"mkdir {shlex.quote(build_dir)}",
+            f"mount --no-canonicalize --bind /proc/self/fd/3 {shlex.quote(build_dir)}",
+            "exec 3<&-",
+        ]
+
+        # Tests, the key and the judge's records are covered by empty mounts
+        for path in self.hidden_paths:
+            if os.path.isdir(path):
+                steps.append(f"mount -t tmpfs -o ro,mode=000 none {shlex.quote(path)}")
+            elif os.path.exists(path):
+                steps.append(f"mount --bind /dev/null {shlex.quote(path)}")
+
+        # The program is a child of the shell rather than the namespace's init,
+        # which ignores signals like SIGXCPU and SIGSEGV
+        steps += [f"cd {shlex.quote(os.path.abspath(cwd))}", '"$@"']
+
+        return [
+            "unshare",
+            "--net",
+            "--mount",
+            "--pid",
+            "--fork",
+            "--kill-child",
+            "--mount-proc",
+            "--",
+            "sh",
+            "-c",
+            " && ".join(steps),
+            "sh",
+            "setpriv",
+            f"--reuid={self.run_uid}",
+            f"--regid={self.run_gid}",
+            "--clear-groups",
+            "--no-new-privs",
+            "--",
+            *command,
+        ]
+
+    def _sandbox_time(self) -> float:
+        # The usage of the sandbox setup is counted with the program's, so it
+        # is measured once on an empty run and taken off every test
+        build_dir = tempfile.mkdtemp(prefix="build-", dir=self.work_dir)
+        os.chown(build_dir, self.run_uid, self.run_gid)
+
+        times = []
+        try:
+            for _ in range(3):
+                process = subprocess.Popen(
+                    self._sandbox(["prlimit", "--", "true"], build_dir, build_dir),
+                    cwd=build_dir,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    env=self._environment(),
+                )
+                _, status, usage = os.wait4(process.pid, 0)
+                if os.waitstatus_to_exitcode(status) != 0:
+                    raise RuntimeError("The native judge could not set up its sandbox")
+
+                times.append(usage.ru_utime + usage.ru_stime)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+        return min(times)
+
+    def _environment(self) -> Dict[str, str]:
+        # Nothing from the judge's own environment, like API keys, is passed on
+        return {"PATH": os.environ.get("PATH", os.defpath)}
+
+    def _command(self, command: List[str], build_dir: str) -> List[str]:
+        build_dir = os.path.abspath(build_dir)
+        return [part.replace("{dir}", build_dir) for part in command]
+
+    def _compilation_error(self, error: str) -> JudgeResult:
+        message = self.result_messages["CE"] + "\n" + error.strip()
+        if len(message) > MAX_CE_MESSAGE_LENGTH:
+            message = message[:MAX_CE_MESSAGE_LENGTH] + "..."
+
+        return JudgeResult(
+            total_points=0,
+            max_execution_time=0,
+            final_message=self.result_messages["CE"],
+            tests_result=[TestResult(points=0, execution_time=0, message=message)],
+        )
+
+    def _build_result(self, tests_result: List[TestResult]) -> JudgeResult:
+        final_message = self.result_messages["AC"]
+        for test in tests_result:
+            if test.message != self.result_messages["AC"]:
+                # Without the exit code, like the Themis final message
+                final_message = test.message.split(" (exit code:")[0]
+                break
+
+        return JudgeResult(
+            total_points=round(
+                sum(test.points for test in tests_result), self.round_digits
+            ),
+            max_execution_time=max(test.execution_time for test in tests_result),
+            final_message=final_message,
+            tests_result=tests_result,
+        )
@@ -0,0 +1,51 @@
+import os
+import json
+from typing import Dict, Optional, Tuple
+from models import ProblemData
+
+
+class ProblemRegistry:
+    def __init__(self, data_file: str):
+        self.data_file = data_file
+        self.problems: Dict[str, ProblemData] = {}
+        self.version: Optional[Tuple[int, int]] = None
+
+        if not self.reload_if_changed():
+            raise RuntimeError(f"Unable to load problems from {data_file}")
+
+    def get(self, problem_id: str) -> ProblemData:
+        return self.problems[problem_id]
+
+    def __contains__(self, problem_id: str) -> bool:
+        return problem_id in self.problems
+
+    def reload_if_changed(self) -> bool:
+        try:
+            stat = os.stat(self.data_file)
+        except OSError as e:
+            print(f"Unable to read {self.data_file}: {e}")
+            return False
+
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self.version:
+            return False
+
+        try:
+            with open(self.data_file, "r", encoding="utf8") as f:
+                problems_data = json.load(f)["problems_data"]
+
+            problems = {
+                problem_id: ProblemData.from_dict(data)
+                for problem_id, data in problems_data.items()
+            }
+        except (OSError, ValueError, KeyError) as e:
+            # Most likely caught halfway through being saved, retry next time
+            print(f"Unable to load problems from {self.data_file}: {e}")
+            return False
+
+        # Swap the whole table at once so readers never see a partial update
+        self.problems = problems
+        self.version = version
+
+        print(f"Loaded {len(problems)} problems from {self.data_file}")
+        return True
@@ -1,15 +1,116 @@
+import os
 import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import asdict
+from models import ProblemData
 from gemini_api import call_gemini_api
-import google.generativeai as genai
+from config import Config
+
+# Everything from a problem that goes into the summarization prompt
+HASHED_FIELDS = ["max_score", "time_limit", "memory_limit", "input_file", "output_file"]
 
 
 class ProblemSummarizer:
-    def summarize_problem(self, problem_data: str) -> str:
+    def __init__(self, timeout: Optional[float] = None, max_attempts: int = 1):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+
+    def summarize_problem(self, problem_data: Dict[str, Any]) -> str:
+        # With the defaults filled in for fields data.json leaves out
+        problem_data = asdict(ProblemData.from_dict(problem_data))
         prompt = self._create_summarization_prompt(problem_data)
-        response = call_gemini_api(prompt)
-        result = self._extract_summary(response)
 
-        return response
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = call_gemini_api(prompt, self.timeout)
+                break
+            except Exception as e:
+                if attempt >= self.max_attempts:
+                    raise
+                print(f"Summarizing {problem_data['name']} failed: {e}, retrying")
+
+        return self._extract_summary(response)
+
+    def summarize_all(
+        self,
+        problems_data: Dict[str, Dict[str, Any]],
+        statements_dir: str,
+        concurrency: int,
+        problem_ids: Optional[List[str]] = None,
+        force: bool = False,
+    ) -> Tuple[int, int]:
+        # Problems are updated in place, returns (summarized, failed)
+        jobs = {}
+        for problem_id, problem_data in problems_data.items():
+            if problem_ids and problem_id not in problem_ids:
+                continue
+
+            statement = self._read_statement(problem_id, statements_dir)
+            if statement is not None:
+                problem_data["statement"] = statement
+
+            if not problem_data.get("statement"):
+                print(f"Problem {problem_id} has no statement, skipped")
+                continue
+
+            statement_hash = self._statement_hash(problem_data)
+            if (
+                not force
+                and problem_data.get("summary")
+                and problem_data.get("statement_hash") == statement_hash
+            ):
+                print(f"Problem {problem_id} is unchanged, skipped")
+                continue
+
+            jobs[problem_id] = statement_hash
+
+        if not jobs:
+            return 0, 0
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                problem_id: executor.submit(
+                    self.summarize_problem, problems_data[problem_id]
+                )
+                for problem_id in jobs
+            }
+
+            for problem_id, future in futures.items():
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    print(f"Unable to summarize problem {problem_id}: {e}")
+                    failed += 1
+                    continue
+
+                problems_data[problem_id]["summary"] = summary
+                problems_data[problem_id]["statement_hash"] = jobs[problem_id]
+                print(f"Summarized problem {problem_id} ({len(summary)} characters)")
+
+        return len(jobs) - failed, failed
+
+    def _read_statement(self, problem_id: str, statements_dir: str) -> Optional[str]:
+        # <statements dir>/<problem id>.txt, otherwise the one in data.json
+        path = os.path.join(statements_dir, f"{problem_id}.txt")
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "r", encoding="utf8") as f:
+            return f.read().strip()
+
+    def _statement_hash(self, problem_data: Dict[str, Any]) -> str:
+        problem_data = asdict(ProblemData.from_dict(problem_data))
+        content = "\0".join(
+            [str(problem_data[field]) for field in HASHED_FIELDS]
+            + [problem_data["statement"]]
+        )
+        return hashlib.sha256(content.encode("utf8")).hexdigest()
 
     def _create_summarization_prompt(self, problem_data: str) -> str:
         return f"""
@@ -53,53 +154,42 @@ Format your response as a clear, structured summary that a code judge can use to
         return summary
 
 
+def save_data(data: Dict[str, Any], data_file: str):
+    # Judges reload data.json when it changes, so it is never seen half written
+    temp_file = data_file + ".tmp"
+    with open(temp_file, "w", encoding="utf8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(temp_file, data_file)
+
+
 if __name__ == "__main__":
-    with open("data.json", "r", encoding="utf8") as f:
-        data = json.load(f)
+    parser = argparse.ArgumentParser(description="Summarize problem statements")
+    parser.add_argument("problem_ids", nargs="*", help="all problems if empty")
+    parser.add_argument("--force", action="store_true", help="ignore statement hashes")
+    args = parser.parse_args()
 
-    problem_id = "CAU4"
-    problem_statement = """
-Cho 𝑛 đồ vật, vật thứ 𝑖 có khối lượng là 𝑤𝑖 và giá trị là 𝑣𝑖
-. Một cái túi có thể chịu
-được khối lượng tối đa là 𝑊, nếu quá thì sẽ bị rách. Hãy tìm cách nhét một số đồ vật
-vào trong túi sao cho túi không bị rách và tổng giá trị của các đồ vật nhét vào là lớn nhất
-có thể.
-Trang 3/3
-Dữ liệu: Nhập từ bàn phím:
-- Dòng đầu tiên chứa hai số nguyên 𝑛 và 𝑊 (1 ≤ 𝑛 ≤ 105
-, 1 ≤ 𝑊 ≤ 109
-).
-- Trong 𝑛 dòng tiếp theo, dòng thứ 𝑖 chứa hai số nguyên 𝑤𝑖 và 𝑣𝑖
-(
-𝑊
-3
-≤ 𝑤𝑖 ≤
-109
-, 1 ≤ 𝑣𝑖 ≤ 109
-).
-Kết quả: Xuất ra file CAU4.OUT:
-- Một dòng duy nhất chứa một số nguyên là tổng giá trị tối đa có thể đạt được.
-Ví dụ:
-Bàn phím CAU4.OUT
-3 5
-2 3
-3 2
-4 4
-5
-    """
-
-    if problem_id not in data["problems_data"]:
-        print(f"Problem ID {problem_id} not found in data.")
-        exit(1)
+    config = Config()
 
-    data["problems_data"][problem_id]["statement"] = problem_statement.strip()
+    with open("data.json", "r", encoding="utf8") as f:
+        data = json.load(f)
 
-    api_summarizer = ProblemSummarizer()
-    api_summary = api_summarizer.summarize_problem(
-        problem_data=data["problems_data"][problem_id]
+    for problem_id in args.problem_ids:
+        if problem_id not in data["problems_data"]:
+            print(f"Problem ID {problem_id} not found in data.")
+            exit(1)
+
+    summarizer = ProblemSummarizer(config.gemini_timeout, config.gemini_max_attempts)
+    summarized, failed = summarizer.summarize_all(
+        data["problems_data"],
+        config.statements_dir,
+        config.gemini_concurrency,
+        args.problem_ids,
+        args.force,
     )
 
-    data["problems_data"][problem_id]["statement"] = api_summary
+    if summarized:
+        save_data(data, "data.json")
 
-    with open("data.json", "w", encoding="utf8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    print(f"Summarized {summarized} problems, {failed} failed")
+    if failed:
+        exit(1)
@@ -0,0 +1,94 @@
+import time
+import random
+import threading
+from typing import Dict, Optional
+from metrics import Metrics
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.fill_rate = per_minute / 60
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        waited = 0.0
+
+        while True:
+            with self.lock:
+                self._refill()
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                delay = (1 - self.tokens) / self.fill_rate
+
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.fill_rate
+        )
+        self.updated = now
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        read_per_minute: float,
+        write_per_minute: float,
+        backoff_base: float,
+        backoff_max: float,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.buckets = {
+            "read": TokenBucket(read_per_minute),
+            "write": TokenBucket(write_per_minute),
+        }
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics or Metrics()
+
+        # Quota -> requests waiting for a token
+        self.lock = threading.Lock()
+        self.waiting: Dict[str, int] = {quota: 0 for quota in self.buckets}
+
+    def acquire(self, quota: str):
+        self._waiting(quota, 1)
+        try:
+            waited = self.buckets[quota].acquire()
+        finally:
+            self._waiting(quota, -1)
+
+        self.metrics.observe("sheet_quota_wait_seconds", waited, quota=quota)
+
+    def throttled(self, quota: str):
+        # Quota is exhausted on the server side, stop spending local tokens too
+        self.buckets[quota].drain()
+        self.metrics.inc("sheet_quota_throttled_total", quota=quota)
+
+    def retry_delay(self, quota: str, attempt: int) -> float:
+        self.metrics.inc("sheet_quota_retries_total", quota=quota)
+
+        # Full jitter keeps several judges from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def failed(self, quota: str):
+        self.metrics.inc("sheet_quota_failures_total", quota=quota)
+
+    def _waiting(self, quota: str, change: int):
+        with self.lock:
+            self.waiting[quota] += change
+            waiting = self.waiting[quota]
+
+        self.metrics.set_gauge("sheet_quota_waiting", waiting, quota=quota)
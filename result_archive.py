@@ -0,0 +1,24 @@
+import os
+import gzip
+import json
+from dataclasses import asdict
+from models import JudgeResult
+
+
+class ResultArchive:
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+
+    def path(self, row: int) -> str:
+        return os.path.join(self.archive_dir, f"{str(row - 1).zfill(4)}.json.gz")
+
+    def save(self, row: int, result: JudgeResult) -> str:
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        path = self.path(row)
+        temp_path = path + ".tmp"
+        with gzip.open(temp_path, "wt", encoding="utf8") as f:
+            json.dump(asdict(result), f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+        return path
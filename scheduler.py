@@ -0,0 +1,82 @@
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from models import Submission
+from problem_registry import ProblemRegistry
+
+FIFO = "fifo"
+FAIR = "fair"
+
+
+class Scheduler:
+    def __init__(
+        self,
+        problem_registry: ProblemRegistry,
+        policy: str = FAIR,
+        aging_time: float = 0,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        if policy not in [FIFO, FAIR]:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+
+        self.problem_registry = problem_registry
+        self.policy = policy
+        self.aging_time = aging_time
+        self.weights = weights or {}
+
+        # Row -> when it was first seen waiting, for aging
+        self.first_seen: Dict[int, float] = {}
+
+    def track(self, rows: Iterable[int]):
+        now = time.time()
+        self.first_seen = {row: self.first_seen.get(row, now) for row in rows}
+
+    def pick(
+        self, rows: List[int], submissions: Dict[int, Submission], taken: Set[int]
+    ) -> Optional[int]:
+        candidates = [row for row in rows if row not in taken]
+        if not candidates:
+            return None
+
+        if self.policy == FIFO:
+            return candidates[0]
+
+        # Round-robin: a contestant's n-th waiting row, counting the ones
+        # already being judged, goes after every other contestant's (n-1)-th
+        turns: Dict[str, int] = {}
+        for row in taken:
+            submission = submissions.get(row)
+            if submission is not None:
+                turns[submission.contestant] = turns.get(submission.contestant, 0) + 1
+
+        now = time.time()
+        best_row = None
+        best_key = None
+
+        for row in candidates:
+            submission = submissions[row]
+            turn = turns.get(submission.contestant, 0)
+            turns[submission.contestant] = turn + 1
+
+            # Expensive problems wait longer, and every row eventually moves
+            # to the front as it ages
+            key = (turn + 1) * self._weight(submission)
+            if self.aging_time > 0:
+                key -= (now - self.first_seen.get(row, now)) / self.aging_time
+
+            if best_key is None or key < best_key:
+                best_row = row
+                best_key = key
+
+        return best_row
+
+    def _weight(self, submission: Submission) -> float:
+        # By problem id first, then by judge type
+        if submission.problem_id in self.weights:
+            return self.weights[submission.problem_id]
+
+        if submission.problem_id in self.problem_registry:
+            judge_type = self.problem_registry.get(submission.problem_id).judge_type
+            if judge_type in self.weights:
+                return self.weights[judge_type]
+
+        return 1.0
@@ -0,0 +1,180 @@
+import re
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+
+class SheetBackend(ABC):
+    @abstractmethod
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]: ...
+
+    @abstractmethod
+    def batch_update(self, data: List[dict]): ...
+
+    @abstractmethod
+    def last_row(self, known_row: int = 1) -> int: ...
+
+
+class GspreadBackend(SheetBackend):
+    def __init__(self, key_file: str, sheet_id: str, contest_id: str):
+        self.key_file = key_file
+        self.sheet_id = sheet_id
+        self.contest_id = contest_id
+        self.worksheet = None
+
+    @property
+    def sheet(self):
+        # Authenticated on the first request, which keeps startup fast
+        if self.worksheet is None:
+            import gspread
+
+            client = gspread.service_account(self.key_file)
+            self.worksheet = client.open_by_key(self.sheet_id).worksheet(
+                self.contest_id
+            )
+
+        return self.worksheet
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        return self.sheet.batch_get(ranges)
+
+    def batch_update(self, data: List[dict]):
+        return self.sheet.batch_update(data)
+
+    def last_row(self, known_row: int = 1) -> int:
+        # One column from a row that exists, the grid itself is usually much
+        # larger than what is filled in
+        values = self.sheet.batch_get([f"A{known_row}:A"])[0]
+        return known_row - 1 + len(values)
+
+
+class SimulatedAPIError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"[{code}] {message}")
+        self.code = code
+
+
+class MemorySheetBackend(SheetBackend):
+    def __init__(
+        self,
+        rows: Optional[List[list]] = None,
+        latency: float = 0,
+        failure_rate: float = 0,
+        seed: Optional[int] = None,
+    ):
+        self.rows: List[List[str]] = [self._to_row(row) for row in rows or []]
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def append_row(self, values: list):
+        with self.lock:
+            self.rows.append(self._to_row(values))
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        self._simulate_call("batch_get")
+
+        with self.lock:
+            return [self._read_range(range_name) for range_name in ranges]
+
+    def batch_update(self, data: List[dict]):
+        self._simulate_call("batch_update")
+
+        with self.lock:
+            for item in data:
+                self._write_range(item["range"], item["values"])
+
+    def last_row(self, known_row: int = 1) -> int:
+        self._simulate_call("last_row")
+
+        with self.lock:
+            return known_row - 1 + len(self._read_range(f"A{known_row}:A"))
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _simulate_call(self, name: str):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            failed = self.random.random() < self.failure_rate
+            code = self.random.choice([429, 500, 503])
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if failed:
+            raise SimulatedAPIError(code, f"Simulated failure in {name}")
+
+    def _read_range(self, range_name: str) -> List[List[str]]:
+        first_row, first_col, last_row, last_col = self._parse_range(range_name)
+        last_row = last_row or len(self.rows)
+        last_col = last_col or max((len(row) for row in self.rows), default=0)
+
+        values = []
+        for row in range(first_row, last_row + 1):
+            values.append(self._trim(self._get_row(row)[first_col - 1 : last_col]))
+
+        while values and not values[-1]:
+            values.pop()
+
+        return values
+
+    def _write_range(self, range_name: str, values: List[list]):
+        first_row, first_col, _, _ = self._parse_range(range_name)
+        self._write_cells(first_row, first_col, values)
+
+    def _write_cells(self, first_row: int, first_col: int, values: List[list]):
+        for row_offset, row_values in enumerate(values):
+            row = first_row + row_offset
+            while len(self.rows) < row:
+                self.rows.append([])
+
+            cells = self.rows[row - 1]
+            for col_offset, value in enumerate(row_values):
+                col = first_col + col_offset
+                while len(cells) < col:
+                    cells.append("")
+                cells[col - 1] = "" if value is None else str(value)
+
+    def _get_row(self, row: int) -> List[str]:
+        return self.rows[row - 1] if 0 < row <= len(self.rows) else []
+
+    def _trim(self, values: List[str]) -> List[str]:
+        values = list(values)
+        while values and values[-1] == "":
+            values.pop()
+
+        return values
+
+    def _to_row(self, values: list) -> List[str]:
+        return ["" if value is None else str(value) for value in values]
+
+    def _parse_range(
+        self, range_name: str
+    ) -> Tuple[int, int, Optional[int], Optional[int]]:
+        cells = range_name.split("!")[-1].split(":")
+        first_col, first_row = self._parse_cell(cells[0])
+
+        if len(cells) == 1:
+            return first_row or 1, first_col or 1, first_row, first_col
+
+        last_col, last_row = self._parse_cell(cells[1])
+        return first_row or 1, first_col or 1, last_row, last_col
+
+    def _parse_cell(self, cell: str) -> Tuple[Optional[int], Optional[int]]:
+        match = re.fullmatch(r"([A-Z]*)(\d*)", cell.upper())
+        if match is None:
+            raise SimulatedAPIError(400, f"Unable to parse range: {cell}")
+
+        letters, digits = match.groups()
+
+        col = 0
+        for letter in letters:
+            col = col * 26 + ord(letter) - ord("A") + 1
+
+        return col or None, int(digits) if digits else None
@@ -1,97 +1,275 @@
 import time
-import gspread
-from typing import List, Optional
-from models import Submission, JudgeResult
+from typing import Any, Dict, List, Optional, Tuple
+from models import Submission, JudgeResult, ProblemData
+from sheet_backend import SheetBackend
+from rate_limiter import RateLimiter
+from lease_manager import parse_lease
+from metrics import Metrics
+from result_archive import ResultArchive
+
+RETRYABLE_CODES = [408, 429, 500, 502, 503, 504]
+
+# The full result goes to the archive, the sheet only keeps what fits here
+MAX_TEST_MESSAGE_LENGTH = 500
+MAX_LOG_LENGTH = 5000
 
 
 class SheetManager:
     def __init__(
-        self, key_file: str, sheet_id: str, contest_id: str, delay_time: float
+        self,
+        backend: SheetBackend,
+        delay_time: float,
+        write_batch_size: int = 50,
+        write_max_age: float = 5,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+        result_archive: Optional[ResultArchive] = None,
     ):
-        self.client = gspread.service_account(key_file)
-        self.sheet = self.client.open_by_key(sheet_id).worksheet(contest_id)
+        self.sheet = backend
         self.delay_time = delay_time
+        self.metrics = metrics or Metrics()
+        self.rate_limiter = rate_limiter or RateLimiter(
+            60, 60, delay_time, 64, self.metrics
+        )
+        self.result_archive = result_archive
+
+        self.write_batch_size = write_batch_size
+        self.write_max_age = write_max_age
+        self.pending_writes: Dict[Tuple[int, int], Any] = {}
+        self.pending_since = 0.0
+
+    def safe_request(self, request_func, *args, quota: str = "read", **kwargs):
+        attempt = 0
 
-    def safe_request(self, request_func, *args, **kwargs):
         while True:
+            self.rate_limiter.acquire(quota)
+
+            call = getattr(request_func, "__name__", "request")
+            start = time.perf_counter()
+
             try:
-                return request_func(*args, **kwargs)
+                response = request_func(*args, **kwargs)
+                self.metrics.observe(
+                    "sheet_request_seconds", time.perf_counter() - start, call=call
+                )
+                return response
             except Exception as e:
-                print(f"Sheet request error: {e}")
-                time.sleep(self.delay_time)
+                code = self._error_code(e)
+                self.metrics.inc("sheet_errors_total", call=call, code=str(code))
 
-    def get_submission(
-        self, row: int, problems_data: dict, code_extension: dict
-    ) -> Optional[Submission]:
-        row_data = self.safe_request(self.sheet.row_values, row)
+                if code not in RETRYABLE_CODES and not (
+                    code is None and isinstance(e, OSError)
+                ):
+                    self.rate_limiter.failed(quota)
+                    print(f"Sheet request failed: {e}")
+                    raise
+
+                if code == 429:
+                    self.rate_limiter.throttled(quota)
+
+                delay = self.rate_limiter.retry_delay(quota, attempt)
+                print(f"Sheet request error: {e}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
 
+    def get_submission_blocks(
+        self, row_ranges: List[Tuple[int, Optional[int]]], last_col: str = "H"
+    ) -> List[Tuple[int, List[List[str]]]]:
+        ranges = [
+            f"A{first_row}:{last_col}{last_row if last_row is not None else ''}"
+            for first_row, last_row in row_ranges
+        ]
+        blocks = self.safe_request(self.sheet.batch_get, ranges)
+
+        return [(first_row, block) for (first_row, _), block in zip(row_ranges, blocks)]
+
+    def get_last_row(self, known_row: int = 1) -> int:
+        return self.safe_request(self.sheet.last_row, known_row)
+
+    def get_statuses(self, last_row: int) -> List[List[str]]:
+        return self.safe_request(self.sheet.batch_get, [f"F2:G{last_row}"])[0]
+
+    def parse_submission(
+        self,
+        row: int,
+        row_data: List[str],
+        problems: Dict[str, ProblemData],
+        code_extension: dict,
+    ) -> Optional[Submission]:
         if not row_data or len(row_data) < 5:
             return None
 
         problem_id = row_data[2][: row_data[2].find(".")]
-        if problem_id not in problems_data:
+        if problem_id not in problems:
             return None
 
         status = row_data[5] if len(row_data) >= 6 else ""
-        judge = row_data[6] if len(row_data) >= 7 else ""
+        judge, lease_token, lease_expires_at = parse_lease(
+            row_data[6] if len(row_data) >= 7 else ""
+        )
 
         return Submission(
             row=row,
             contestant=row_data[1],
             problem_id=problem_id,
-            problem_name=problems_data[problem_id]["name"],
+            problem_name=problems[problem_id].name,
             language=row_data[3],
             extension=code_extension.get(row_data[3], "txt"),
             source_code=row_data[4],
             status=status,
             judge=judge,
+            lease_token=lease_token,
+            lease_expires_at=lease_expires_at,
         )
 
     def update_status(
         self, row: int, status: str, judge_id: str, judge_type: str = "Themis"
     ):
-        self.safe_request(
-            self.sheet.update, [[status, judge_id, judge_type]], f"F{row}:H{row}"
-        )
+        self._queue_write(row, 6, [status, judge_id, judge_type])
 
     def update_single_cell(self, row: int, col: int, value: str):
-        self.safe_request(self.sheet.update_cell, row, col, value)
+        self._queue_write(row, col, [value])
 
     def update_results(self, row: int, result: JudgeResult, round_digits: int):
-        formatted_log = self._format_log(result, round_digits)
+        archive_path = None
+        if self.result_archive is not None:
+            archive_path = self.result_archive.save(row, result)
 
-        self.safe_request(
-            self.sheet.update,
+        formatted_log = self._format_log(result, round_digits, archive_path)
+
+        self._queue_write(
+            row,
+            9,
             [
-                [
-                    f"%.{round_digits}f" % result.total_points,
-                    result.max_execution_time,
-                    result.final_message,
-                    formatted_log,
-                ]
+                f"%.{round_digits}f" % result.total_points,
+                result.max_execution_time,
+                result.final_message,
+                formatted_log,
             ],
-            f"I{row}:L{row}",
         )
 
-    def get_empty_rows(self) -> List[int]:
-        current_status = self.safe_request(self.sheet.col_values, 7)
+    def flush(self):
+        if not self.pending_writes:
+            return
+
+        data = []
+        for row, first_col, values in self._pending_ranges():
+            last_col = first_col + len(values) - 1
+            data.append(
+                {
+                    "range": f"{self._to_a1(row, first_col)}:{self._to_a1(row, last_col)}",
+                    "values": [values],
+                }
+            )
+
+        writes = self.pending_writes
+        self.pending_writes = {}
+
+        try:
+            self.safe_request(self.sheet.batch_update, data, quota="write")
+        except Exception:
+            # Kept for the next flush, without replacing newer values
+            for cell, value in writes.items():
+                self.pending_writes.setdefault(cell, value)
+            raise
+
+        self.metrics.inc("sheet_cells_written_total", len(writes))
+
+    def _queue_write(self, row: int, col: int, values: list):
+        if not self.pending_writes:
+            self.pending_since = time.time()
+
+        # A later write to the same cell replaces the pending one
+        for offset, value in enumerate(values):
+            self.pending_writes[(row, col + offset)] = value
+
+        if (
+            len(self.pending_writes) >= self.write_batch_size
+            or time.time() >= self.pending_since + self.write_max_age
+        ):
+            try:
+                self.flush()
+            except Exception:
+                # Still buffered, the judge loop flushes again after this step
+                pass
+
+    def _pending_ranges(self) -> List[Tuple[int, int, list]]:
+        ranges = []
+
+        for row, col in sorted(self.pending_writes):
+            value = self.pending_writes[(row, col)]
+
+            if ranges and ranges[-1][0] == row:
+                _, first_col, values = ranges[-1]
+                if first_col + len(values) == col:
+                    values.append(value)
+                    continue
+
+            ranges.append((row, col, [value]))
+
+        return ranges
+
+    def _error_code(self, error: Exception) -> Optional[int]:
+        code = getattr(error, "code", None)
+        if isinstance(code, int):
+            return code
+
+        # gspread.exceptions.APIError keeps the HTTP response
+        response = getattr(error, "response", None)
+        return getattr(response, "status_code", None)
+
+    def _to_a1(self, row: int, col: int) -> str:
+        letters = ""
+        while col > 0:
+            col, remainder = divmod(col - 1, 26)
+            letters = chr(ord("A") + remainder) + letters
+
+        return f"{letters}{row}"
+
+    def _format_log(
+        self, result: JudgeResult, round_digits: int, archive_path: str | None = None
+    ) -> str:
+        lines = [
+            f"Tổng: [{f'%.{round_digits}f' % result.total_points} điểm, {result.max_execution_time} ms] {result.final_message}"
+        ]
+
+        # Consecutive tests with the same points and message share one line,
+        # showing the longest time among them
+        tests = result.tests_result
+        first = 0
+        while first < len(tests):
+            last = first
+            execution_time = tests[first].execution_time
+            while (
+                last + 1 < len(tests)
+                and tests[last + 1].points == tests[first].points
+                and tests[last + 1].message == tests[first].message
+            ):
+                last += 1
+                execution_time = max(execution_time, tests[last].execution_time)
 
-        empty_rows = []
-        for i in range(2, len(current_status) + 1):
-            if current_status[i - 1] == "":
-                empty_rows.append(i)
+            message = tests[first].message
+            if len(message) > MAX_TEST_MESSAGE_LENGTH:
+                message = message[:MAX_TEST_MESSAGE_LENGTH] + "..."
 
-        empty_rows.append(len(current_status) + 1)
+            label = f"#{first + 1}" if first == last else f"#{first + 1}-{last + 1}"
+            lines.append(
+                f"{label}: [{f'%.{round_digits}f' % tests[first].points} điểm, {execution_time} ms] {message}"
+            )
 
-        return empty_rows
+            first = last + 1
 
-    def is_cell_empty(self, row: int, col: int) -> bool:
-        return self.safe_request(self.sheet.cell, row, col).value is None
+        # Whole lines are dropped rather than cut halfway
+        length = 0
+        for count, line in enumerate(lines):
+            length += len(line) + 1
+            if length > MAX_LOG_LENGTH:
+                lines = lines[:count] + ["..."]
+                break
 
-    def _format_log(self, result: JudgeResult, round_digits: int) -> str:
-        log = f"Tổng: [{f'%.{round_digits}f' % result.total_points} điểm, {result.max_execution_time} ms] {result.final_message}"
+        log = "\n".join(lines)
 
-        for i, test in enumerate(result.tests_result):
-            log += f"\n#{i + 1}: [{f'%.{round_digits}f' % test.points} điểm, {test.execution_time} ms] {test.message}"
+        if archive_path is not None:
+            log += f"\nChi tiết: {archive_path}"
 
         return log
@@ -0,0 +1,190 @@
+import re
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Set, Tuple
+
+# Fingerprints are hashes of this many consecutive tokens, and every run of
+# GUARANTEE_LENGTH matching tokens shares at least one of them
+NOISE_LENGTH = 6
+GUARANTEE_LENGTH = 12
+WINDOW_SIZE = GUARANTEE_LENGTH - NOISE_LENGTH + 1
+
+HASH_BASE = 1000003
+HASH_MASK = (1 << 64) - 1
+
+# Fingerprints found in more than this share of submissions are boilerplate
+# (includes, fast io, main) and say nothing about copying
+MAX_SHARE = 0.2
+MIN_POSTINGS = 5
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/|\#[^\n]*|\{\$.*?\}|\(\*.*?\*\))
+    |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    |(?P<number>\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<operator><<=|>>=|->|::|<<|>>|<=|>=|==|!=|&&|\|\||\+\+|--|[-+*/%&|^]?=|\S)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+KEYWORDS = set("""
+    auto bool break case char class const continue default delete do double
+    else enum for if int long new return short signed sizeof static struct
+    switch template typedef typename unsigned using void while def elif in
+    lambda not and or pass yield begin end then var procedure function repeat
+    until
+    """.split())
+
+
+def tokenize(source: str) -> List[str]:
+    # Identifiers and literals collapse to placeholders so renaming variables
+    # or changing constants does not hide a copy
+    tokens = []
+
+    for match in TOKEN_PATTERN.finditer(source):
+        kind = match.lastgroup
+        if kind == "skip":
+            continue
+
+        value = match.group()
+        if kind == "name":
+            tokens.append(value if value in KEYWORDS else "v")
+        elif kind == "number":
+            tokens.append("n")
+        elif kind == "string":
+            tokens.append("s")
+        else:
+            tokens.append(value)
+
+    return tokens
+
+
+def fingerprint(source: str) -> Set[int]:
+    tokens = tokenize(source)
+    if len(tokens) < NOISE_LENGTH:
+        return set()
+
+    # Rolling hash of every NOISE_LENGTH tokens
+    ids = [zlib.crc32(token.encode()) for token in tokens]
+    top = pow(HASH_BASE, NOISE_LENGTH - 1, 1 << 64)
+
+    value = 0
+    for token_id in ids[:NOISE_LENGTH]:
+        value = (value * HASH_BASE + token_id) & HASH_MASK
+
+    hashes = [value]
+    for i in range(NOISE_LENGTH, len(ids)):
+        value = (value - ids[i - NOISE_LENGTH] * top) & HASH_MASK
+        value = (value * HASH_BASE + ids[i]) & HASH_MASK
+        hashes.append(value)
+
+    # Winnowing: keep the smallest hash of every window, tracked with a deque
+    # of candidates in increasing order
+    selected = set()
+    window: Deque[int] = deque()
+    for i, value in enumerate(hashes):
+        while window and hashes[window[-1]] >= value:
+            window.pop()
+        window.append(i)
+
+        if window[0] <= i - WINDOW_SIZE:
+            window.popleft()
+
+        if i >= WINDOW_SIZE - 1 or i == len(hashes) - 1:
+            selected.add(hashes[window[0]])
+
+    return selected
+
+
+@dataclass
+class SimilarPair:
+    first: str
+    second: str
+    shared: int
+    score: float
+
+
+class SimilarityIndex:
+    def __init__(self, max_share: float = MAX_SHARE):
+        self.max_share = max_share
+        self.fingerprints: Dict[str, Set[int]] = {}
+        self.postings: Dict[int, List[str]] = {}
+
+    def add(self, name: str, source: str):
+        if name in self.fingerprints:
+            self.remove(name)
+
+        fingerprints = fingerprint(source)
+        self.fingerprints[name] = fingerprints
+
+        for value in fingerprints:
+            self.postings.setdefault(value, []).append(name)
+
+    def remove(self, name: str):
+        for value in self.fingerprints.pop(name, set()):
+            names = self.postings[value]
+            names.remove(name)
+            if not names:
+                del self.postings[value]
+
+    def pairs(self, min_shared: int = 3) -> List[SimilarPair]:
+        # Only submissions that share a fingerprint are ever compared, so the
+        # cost follows the number of matches instead of every pair
+        max_postings = max(MIN_POSTINGS, int(self.max_share * len(self.fingerprints)))
+        shared: Dict[Tuple[str, str], int] = {}
+
+        for names in self.postings.values():
+            if len(names) < 2 or len(names) > max_postings:
+                continue
+
+            names = sorted(names)
+            for i, first in enumerate(names):
+                for second in names[i + 1 :]:
+                    shared[(first, second)] = shared.get((first, second), 0) + 1
+
+        pairs = []
+        for (first, second), count in shared.items():
+            if count < min_shared:
+                continue
+
+            smaller = min(len(self.fingerprints[first]), len(self.fingerprints[second]))
+            pairs.append(SimilarPair(first, second, count, count / smaller))
+
+        return sorted(pairs, key=lambda pair: (-pair.score, -pair.shared))
+
+
+def cluster(pairs: Iterable[SimilarPair], threshold: float) -> List[List[str]]:
+    parent: Dict[str, str] = {}
+    best: Dict[str, float] = {}
+
+    def find(name: str) -> str:
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for pair in pairs:
+        if pair.score < threshold:
+            continue
+
+        for name in (pair.first, pair.second):
+            parent.setdefault(name, name)
+
+        first, second = find(pair.first), find(pair.second)
+        if first != second:
+            parent[second] = first
+            best[first] = max(best.get(first, 0.0), best.pop(second, 0.0))
+
+        best[first] = max(best.get(first, 0.0), pair.score)
+
+    clusters: Dict[str, List[str]] = {}
+    for name in parent:
+        clusters.setdefault(find(name), []).append(name)
+
+    # Clusters with the strongest match first
+    return [
+        sorted(names)
+        for root, names in sorted(clusters.items(), key=lambda item: -best[item[0]])
+    ]
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import sqlite3
+from typing import Any, Dict, Tuple
+
+IN_FLIGHT_STATES = ["Queuing", "Claiming", "Waiting", "Judging"]
+
+
+# Restart state only: the rows this judge had in flight, their transitions for
+# auditing, and the queue's scan marks. The sheet stays the source of truth,
+# resumed rows are checked against it before any work is done on them
+class SubmissionJournal:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                state TEXT NOT NULL,
+                judge TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS transitions (
+                row INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                judge TEXT NOT NULL,
+                at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """)
+        self.connection.commit()
+
+        self.rows: Dict[int, Tuple[str, str]] = {
+            row: (state, judge)
+            for row, state, judge in self.connection.execute(
+                "SELECT row, state, judge FROM rows"
+            )
+        }
+
+    def record(self, row: int, state: str, judge: str):
+        if self.rows.get(row) == (state, judge):
+            return
+
+        now = time.time()
+        self.rows[row] = (state, judge)
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)", (row, state, judge, now)
+        )
+        self.connection.execute(
+            "INSERT INTO transitions VALUES (?, ?, ?, ?)", (row, state, judge, now)
+        )
+        self.connection.commit()
+
+    def in_flight(self, judge_id: str) -> Dict[int, str]:
+        return {
+            row: state
+            for row, (state, judge) in self.rows.items()
+            if judge == judge_id and state in IN_FLIGHT_STATES
+        }
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+
+        return json.loads(row[0]) if row is not None else default
+
+    def set_meta(self, key: str, value: Any):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value))
+        )
+        self.connection.commit()
@@ -0,0 +1,216 @@
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from models import Submission
+from sheet_manager import SheetManager
+from problem_registry import ProblemRegistry
+from submission_journal import SubmissionJournal
+from scheduler import Scheduler, FIFO
+
+NEW = "new"
+WAITING = "waiting"
+JUDGING = "judging"
+EXPIRED = "expired"
+OTHER = "other"
+
+# Rows already owned by this judge are resumed before new rows are claimed, and
+# rows abandoned by a dead judge are taken over last
+POP_ORDER = [JUDGING, WAITING, NEW, EXPIRED]
+
+# Rows in these states are ordered by the scheduler, the others by row
+SCHEDULED_STATES = [NEW, EXPIRED]
+
+# Gaps between re-read rows up to this size are fetched rather than split
+MAX_RANGE_GAP = 10
+
+
+class SubmissionQueue:
+    def __init__(
+        self,
+        sheet_manager: SheetManager,
+        judge_id: str,
+        problem_registry: ProblemRegistry,
+        code_extension: dict,
+        journal: SubmissionJournal,
+        reset_time: float,
+        scheduler: Optional[Scheduler] = None,
+    ):
+        self.sheet_manager = sheet_manager
+        self.judge_id = judge_id
+        self.problem_registry = problem_registry
+        self.code_extension = code_extension
+        self.journal = journal
+        self.reset_time = reset_time
+        self.scheduler = scheduler or Scheduler(problem_registry, FIFO)
+
+        self.submissions: Dict[int, Submission] = {}
+        self.index: Dict[str, List[int]] = {
+            state: [] for state in [NEW, WAITING, JUDGING, EXPIRED, OTHER]
+        }
+        self.taken: Set[int] = set()
+
+        # Rows the judge cannot handle with the current problem data
+        self.skipped: Set[int] = set()
+
+        # Rows up to the high-water mark have been read, and only the ones that
+        # are not judged yet can still change and need to be read again
+        self.high_water = journal.get_meta("high_water", 1)
+        self.volatile_rows: Set[int] = set(journal.get_meta("volatile_rows", []))
+        self.saved_high_water = self.high_water
+
+        # Judged rows are not read again, a narrow status check every
+        # reset_time catches the ones reset by hand. Also run at startup for
+        # edits made while the judge was down
+        self.last_audit = 0.0
+
+    def refresh(self):
+        if time.time() >= self.last_audit + self.reset_time:
+            self.last_audit = time.time()
+            self._audit()
+
+        row_ranges = self._volatile_ranges()
+
+        if row_ranges:
+            # Starts on a row known to exist, an open range past the end of
+            # the grid is rejected
+            row_ranges.append((max(2, self.high_water), None))
+        else:
+            # Nothing below the mark can change, so only look further when
+            # the sheet has grown
+            if self.sheet_manager.get_last_row(self.high_water) <= self.high_water:
+                return
+
+            row_ranges.append((self.high_water + 1, None))
+
+        submissions = dict(self.submissions)
+        for first_row, last_row in row_ranges:
+            for row in range(first_row, (last_row or first_row - 1) + 1):
+                submissions.pop(row, None)
+
+        for first_row, block in self.sheet_manager.get_submission_blocks(row_ranges):
+            for offset, row_data in enumerate(block):
+                row = first_row + offset
+
+                if row_data:
+                    self.high_water = max(self.high_water, row)
+
+                submission = self.sheet_manager.parse_submission(
+                    row, row_data, self.problem_registry.problems, self.code_extension
+                )
+
+                if submission is not None:
+                    submissions[row] = submission
+
+        index = {state: [] for state in self.index}
+        for row in sorted(submissions):
+            state = self._classify(submissions[row])
+
+            if state is None:
+                # Rows in flight stay visible until the judge releases them
+                if row not in self.taken:
+                    del submissions[row]
+            else:
+                index[state].append(row)
+
+        self.submissions = submissions
+        self.index = index
+        self.scheduler.track(row for state in SCHEDULED_STATES for row in index[state])
+        self._save_marks(set(submissions))
+
+    def pop(self) -> Optional[int]:
+        for state in POP_ORDER:
+            rows = [row for row in self.index[state] if row not in self.skipped]
+
+            if state in SCHEDULED_STATES:
+                row = self.scheduler.pick(rows, self.submissions, self.taken)
+            else:
+                row = next((row for row in rows if row not in self.taken), None)
+
+            if row is not None:
+                self.taken.add(row)
+                return row
+
+        return None
+
+    def release(self, row: int):
+        self.taken.discard(row)
+
+    def skip(self, row: int):
+        self.skipped.add(row)
+
+    def get(self, row: int) -> Optional[Submission]:
+        return self.submissions.get(row)
+
+    def count(self, state: str) -> int:
+        return sum(
+            1
+            for row in self.index[state]
+            if row not in self.taken and row not in self.skipped
+        )
+
+    def request_audit(self):
+        self.last_audit = 0.0
+
+    def _audit(self):
+        if self.high_water < 2:
+            return
+
+        # Status and judge only, never the source code
+        statuses = self.sheet_manager.get_statuses(self.high_water)
+
+        reopened = set()
+        for offset in range(self.high_water - 1):
+            row = offset + 2
+            if row in self.volatile_rows or row in self.submissions:
+                continue
+
+            cells = statuses[offset] if offset < len(statuses) else []
+            if not cells or cells[0] != "Đã chấm":
+                reopened.add(row)
+
+        if reopened:
+            print(f"{len(reopened)} rows changed on the sheet, reading them again")
+            self.volatile_rows |= reopened
+
+    def _volatile_ranges(self) -> List[Tuple[int, Optional[int]]]:
+        row_ranges = []
+
+        for row in sorted(self.volatile_rows | self.taken):
+            if row > self.high_water:
+                continue
+
+            if row_ranges and row - row_ranges[-1][1] <= MAX_RANGE_GAP + 1:
+                row_ranges[-1] = (row_ranges[-1][0], row)
+            else:
+                row_ranges.append((row, row))
+
+        return row_ranges
+
+    def _save_marks(self, volatile_rows: Set[int]):
+        if self.high_water != self.saved_high_water:
+            self.journal.set_meta("high_water", self.high_water)
+            self.saved_high_water = self.high_water
+
+        if volatile_rows != self.volatile_rows:
+            self.journal.set_meta("volatile_rows", sorted(volatile_rows))
+
+        self.volatile_rows = volatile_rows
+
+    def _classify(self, submission: Submission) -> Optional[str]:
+        if submission.judge == "":
+            return NEW if submission.status == "" else None
+
+        if submission.judge != self.judge_id:
+            if submission.status == "Đã chấm":
+                return None
+
+            if 0 < submission.lease_expires_at < time.time():
+                return EXPIRED
+
+            return OTHER
+
+        if submission.status == "Đang chờ":
+            return WAITING
+        elif submission.status == "Đang chấm":
+            return JUDGING
+
+        return None
@@ -1,100 +1,194 @@
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, TextIO
 from models import JudgeResult, TestResult, ProblemData
+from metrics import Metrics
+
+TEST_MARKER = chr(0x2023)
+MAX_CE_MESSAGE_LENGTH = 10000
 
 
 class ThemisJudge:
-    def __init__(self, result_messages: dict, round_digits: int):
+    def __init__(
+        self,
+        result_messages: dict,
+        round_digits: int,
+        metrics: Optional[Metrics] = None,
+    ):
         self.result_messages = result_messages
         self.round_digits = round_digits
+        self.metrics = metrics or Metrics()
+
+        self.failure_messages = [
+            self.result_messages[message_code]
+            for message_code in ["WA", "RE", "TLE", "NOF"]
+        ]
 
-    def parse_log(self, log: str, problem_data: ProblemData) -> JudgeResult:
-        logs = log.split("\n")
+    def parse_log(self, log: str | TextIO, problem_data: ProblemData) -> JudgeResult:
+        with self.metrics.timer("themis_parse_seconds"):
+            return self._parse_log(log, problem_data)
+
+    def _parse_log(self, log: str | TextIO, problem_data: ProblemData) -> JudgeResult:
+        if isinstance(log, str):
+            lines = iter(log.split("\n"))
+        else:
+            lines = self._iter_lines(log)
 
-        problem_name, language = logs[1].split(".")
+        header = next(lines)
+        submission_line = next(lines)
+
+        problem_name, language = submission_line.split(".")
 
         assert problem_name == problem_data.name, "Problem name does not match"
 
-        total_points = 0
-        max_execution_time = 0
-        final_message = None
-        tests_result = []
+        ce_lines, test_blocks = self._scan_lines(
+            chain([submission_line], lines),
+            problem_name,
+            language,
+            self.result_messages["CE"] in header,
+        )
 
-        if self.result_messages["CE"] in log:
-            final_message = self.result_messages["CE"]
-            message = self._parse_compilation_error(logs, problem_name, language)
-            tests_result.append(TestResult(points=0, execution_time=0, message=message))
-        else:
-            total_points = round(
-                float(logs[0].split(" ")[-1].replace(",", ".")), self.round_digits
-            )
+        if ce_lines is not None:
+            message = "\n".join(ce_lines)
+            if len(message) > MAX_CE_MESSAGE_LENGTH:
+                message = message[:MAX_CE_MESSAGE_LENGTH] + "..."
 
-            tests_result, max_execution_time, final_message = self._parse_test_results(
-                logs, problem_data.time_limit
+            return JudgeResult(
+                total_points=0,
+                max_execution_time=0,
+                final_message=self.result_messages["CE"],
+                tests_result=[TestResult(points=0, execution_time=0, message=message)],
             )
 
-        total_points = round(total_points, self.round_digits)
+        total_points = round(
+            float(header.split(" ")[-1].replace(",", ".")), self.round_digits
+        )
+
+        tests_result, max_execution_time, final_message = self._build_test_results(
+            test_blocks, problem_data.time_limit
+        )
 
         return JudgeResult(
-            total_points=total_points,
+            total_points=round(total_points, self.round_digits),
             max_execution_time=max_execution_time,
             final_message=final_message,
             tests_result=tests_result,
         )
 
-    def _parse_compilation_error(
-        self, logs: list, problem_name: str, language: str
-    ) -> str:
-        message = self.result_messages["CE"]
-        for i in range(3, len(logs) - 1):
-            if logs[i] == "Dịch lỗi!":
-                break
-
-            if logs[i].split(".")[0] == problem_name:
-                logs[i] = logs[i].replace(problem_name, "main", 1)
-            elif logs[i].split(" ")[0] == "Error:" and language == "pas":  # Pascal
+    def _scan_lines(
+        self,
+        lines: Iterable[str],
+        problem_name: str,
+        language: str,
+        is_compilation_error: bool,
+    ) -> tuple:
+        # Single pass over the log from its second line on. Compilation error
+        # lines and test blocks are collected side by side, as whether the log
+        # is a compilation error may only become known further down.
+        ce_message = self.result_messages["CE"]
+        ac_message = self.result_messages["AC"]
+        failure_messages = self.failure_messages
+
+        ce_lines: List[str] = [ce_message]
+        ce_length = len(ce_message)
+        ce_done = False
+        previous = None
+
+        test_blocks = []
+        test_error = None
+        test_header = None
+        execution_time = 0
+        message = ac_message
+        exit_code = 0
+
+        for index, line in enumerate(lines, start=1):
+            if not is_compilation_error and ce_message in line:
+                is_compilation_error = True
+
+            # Compilation error lines start at the fourth line and never include
+            # the last one, so each line is only added once the next one is read
+            if index > 3 and not ce_done:
+                if previous == "Dịch lỗi!":
+                    ce_done = True
+                else:
+                    if previous.partition(".")[0] == problem_name:
+                        ce_line = previous.replace(problem_name, "main", 1)
+                    elif language == "pas" and previous.partition(" ")[0] == "Error:":
+                        ce_line = None
+                    else:
+                        ce_line = previous
+
+                    if ce_line is not None:
+                        ce_lines.append(ce_line)
+                        ce_length += len(ce_line) + 1
+
+                        # Everything past the limit is cut off anyway
+                        if ce_length > MAX_CE_MESSAGE_LENGTH:
+                            ce_done = True
+
+            previous = line
+
+            if is_compilation_error:
+                if ce_done:
+                    break
                 continue
 
-            message += "\n" + logs[i]
+            if TEST_MARKER in line:
+                if test_header is not None:
+                    test_blocks.append(
+                        (test_header, execution_time, message, exit_code)
+                    )
+
+                test_header = line
+                execution_time = 0
+                message = ac_message
+                exit_code = 0
 
-        return message[:10000] + "..." if len(message) > 10000 else message
+            if test_header is None:
+                continue
 
-    def _parse_test_results(self, logs: list, time_limit: float) -> tuple:
+            if message == ac_message:
+                for failure_message in failure_messages:
+                    if failure_message in line:
+                        message = failure_message
+                        break
+
+            try:
+                if line.startswith("Thời gian"):
+                    words = line.split(" ")
+                    if words[:2] == ["Thời", "gian"]:
+                        execution_time = round(
+                            float(words[-2].replace(",", ".")) * 1000
+                        )
+
+                if "exit code:" in line:
+                    words = line.split(" ")
+                    for idx in range(len(words) - 3):
+                        if words[idx : idx + 2] == ["exit", "code:"]:
+                            exit_code = int(words[idx + 2])
+            except ValueError as e:
+                test_error = test_error or e
+
+        if is_compilation_error:
+            return ce_lines, None
+
+        # Malformed test lines only matter when the log is not a compilation error
+        if test_error is not None:
+            raise test_error
+
+        if test_header is not None:
+            test_blocks.append((test_header, execution_time, message, exit_code))
+
+        return None, test_blocks
+
+    def _build_test_results(self, test_blocks: list, time_limit: float) -> tuple:
         tests_result = []
         max_execution_time = 0
         final_message = None
 
-        i = 1
-        while i < len(logs) and chr(0x2023) not in logs[i]:
-            i += 1
-
-        while i < len(logs):
-            j = i + 1
-            while j < len(logs) and chr(0x2023) not in logs[j]:
-                j += 1
-            j -= 1
-
+        for test_header, execution_time, message, exit_code in test_blocks:
             points = round(
-                float(logs[i].split(" ")[-1].replace(",", ".")), self.round_digits
+                float(test_header.split(" ")[-1].replace(",", ".")), self.round_digits
             )
-            execution_time = 0
-            message = self.result_messages["AC"]
-            exit_code = 0
-
-            for k in range(i, j + 1):
-                words = logs[k].split(" ")
-
-                for message_code in ["WA", "RE", "TLE", "NOF"]:
-                    if (
-                        self.result_messages[message_code] in logs[k]
-                        and message == self.result_messages["AC"]
-                    ):
-                        message = self.result_messages[message_code]
-
-                if words[:2] == ["Thời", "gian"]:
-                    execution_time = round(float(words[-2].replace(",", ".")) * 1000)
-
-                for idx in range(len(words) - 3):
-                    if words[idx : idx + 2] == ["exit", "code:"]:
-                        exit_code = int(words[idx + 2])
 
             if message == self.result_messages["TLE"]:
                 execution_time = round(time_limit * 1000)
@@ -113,9 +207,18 @@ class ThemisJudge:
                 )
             )
 
-            i = j + 1
-
         if final_message is None:
             final_message = self.result_messages["AC"]
 
         return tests_result, max_execution_time, final_message
+
+    def _iter_lines(self, stream: Iterable[str]) -> Iterator[str]:
+        # Same lines as str.split("\n"), including the trailing empty one
+        for line in stream:
+            if not line.endswith("\n"):
+                yield line
+                return
+
+            yield line[:-1]
+
+        yield ""
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from dataclasses import asdict
+from typing import Optional
+from models import JudgeResult, TestResult
+
+
+def normalize_source(
+    source_code: str, language: str, normalize_whitespace: bool = True
+) -> str:
+    source_code = source_code.replace("\r\n", "\n")
+
+    # Programs that are compiled and run can depend on any whitespace, in raw
+    # strings, line continuations or multi-line literals
+    if not normalize_whitespace:
+        return source_code
+
+    lines = source_code.replace("\r", "\n").split("\n")
+
+    # Indentation is only meaningful in Python
+    if language == "Python":
+        lines = [line.rstrip() for line in lines]
+    else:
+        lines = [line.strip() for line in lines]
+
+    return "\n".join(line for line in lines if line)
+
+
+def source_hash(
+    source_code: str, language: str, normalize_whitespace: bool = True
+) -> str:
+    normalized = normalize_source(source_code, language, normalize_whitespace)
+    return hashlib.sha256(normalized.encode("utf8")).hexdigest()
+
+
+def test_set_fingerprint(tests_dir: str) -> Optional[str]:
+    if not os.path.isdir(tests_dir):
+        return None
+
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(tests_dir):
+        dirs.sort()
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            stat = os.stat(path)
+            entry = f"{os.path.relpath(path, tests_dir)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+            digest.update(entry.encode("utf8") + b"\n")
+
+    return digest.hexdigest()
+
+
+class VerdictCache:
+    def __init__(self, path: str, max_entries: int, max_age: float):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                problem_id TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+            """)
+        self.connection.commit()
+
+        self._evict()
+
+    def make_key(self, *parts: str) -> str:
+        return hashlib.sha256("\0".join(parts).encode("utf8")).hexdigest()
+
+    def get(self, key: str) -> Optional[JudgeResult]:
+        row = self.connection.execute(
+            "SELECT result, created_at FROM verdicts WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        result, created_at = row
+        now = time.time()
+
+        if created_at < now - self.max_age:
+            self.connection.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+            self.connection.commit()
+            return None
+
+        self.connection.execute(
+            "UPDATE verdicts SET used_at = ? WHERE key = ?", (now, key)
+        )
+        self.connection.commit()
+
+        data = json.loads(result)
+        data["tests_result"] = [TestResult(**test) for test in data["tests_result"]]
+        return JudgeResult(**data)
+
+    def put(self, key: str, problem_id: str, result: JudgeResult):
+        now = time.time()
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)",
+            (key, problem_id, json.dumps(asdict(result), ensure_ascii=False), now, now),
+        )
+        self.connection.commit()
+
+        self._evict()
+
+    def discard(self, problem_id: str):
+        self.connection.execute(
+            "DELETE FROM verdicts WHERE problem_id = ?", (problem_id,)
+        )
+        self.connection.commit()
+
+    def _evict(self):
+        self.connection.execute(
+            "DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.max_age,)
+        )
+        self.connection.execute(
+            """
+            DELETE FROM verdicts WHERE key NOT IN (
+                SELECT key FROM verdicts ORDER BY used_at DESC LIMIT ?
+            )
+            """,
+            (self.max_entries,),
+        )
+        self.connection.commit()